@@ -1,7 +1,16 @@
 import logging
+import os
 
 __version__ = "0.2.1"
 
 
 def logger():
     return logging.getLogger("open_dubbing")
+
+
+def get_cache_directory(name: str) -> str:
+    """Directory where open-dubbing caches the models it converts."""
+    cache_home = os.environ.get(
+        "XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")
+    )
+    return os.path.join(cache_home, "open_dubbing", name)
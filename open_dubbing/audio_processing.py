@@ -16,26 +16,66 @@
 import os
 import warnings
 
-from typing import Final, Mapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Final, Mapping, Sequence
 
 import numpy as np
-import torch
-
-from moviepy import AudioFileClip
-from pyannote.audio import Pipeline
 
 from open_dubbing import logger
 from open_dubbing.pydub_audio_segment import AudioSegment
 
+# The diarization libraries are imported when used, they load torch
+if TYPE_CHECKING:
+    from pyannote.audio import Model, Pipeline
+
 _DEFAULT_DUBBED_VOCALS_AUDIO_FILE: Final[str] = "dubbed_vocals.mp3"
 _DEFAULT_DUBBED_AUDIO_FILE: Final[str] = "dubbed_audio"
 _DEFAULT_OUTPUT_FORMAT: Final[str] = ".mp3"
+# Sampling rate expected by the diarization, VAD and speaker embedding models
+_MODELS_SAMPLING_RATE: Final[int] = 16000
+# Distance threshold used by pyannote/speaker-diarization-3.1 for the same embeddings
+_SPEAKER_CLUSTERING_THRESHOLD: Final[float] = 0.7045654963945799
+
+
+class _ActiveSpeakersEmbedding:
+    """Wraps the embedding model of the Pyannote pipeline to skip inactive speakers.
+
+    The pipeline asks for an embedding of each of the local speakers of every
+    chunk, usually only one or two of them speak in a chunk. Embeddings of
+    speakers without any active frame are not a number (NaN) and are ignored by
+    the clustering, so they are not computed.
+    """
+
+    def __init__(self, embedding):
+        self._embedding = embedding
+
+    def __getattr__(self, name):
+        return getattr(self._embedding, name)
+
+    def __call__(self, waveforms, masks=None):
+        if masks is None:
+            return self._embedding(waveforms)
+
+        active = (masks.sum(dim=1) > 0).cpu()
+        embeddings = np.full(
+            (len(waveforms), self._embedding.dimension), np.nan, dtype=np.float32
+        )
+        if active.any():
+            embeddings[active.numpy()] = self._embedding(
+                waveforms[active], masks=masks[active]
+            )
+        return embeddings
+
+
+def skip_inactive_speakers_embeddings(pipeline: "Pipeline") -> None:
+    """Makes the pipeline compute embeddings only for active speakers."""
+    pipeline._embedding = _ActiveSpeakersEmbedding(pipeline._embedding)
 
 
 def create_pyannote_timestamps(
     *,
     audio_file: str,
-    pipeline: Pipeline,
+    pipeline: "Pipeline",
     device: str = "cpu",
 ) -> Sequence[Mapping[str, float]]:
     """Creates timestamps from a vocals file using Pyannote speaker diarization.
@@ -44,11 +84,24 @@ def create_pyannote_timestamps(
         A list of dictionaries containing start and end timestamps for each
         speaker segment.
     """
+    import torch
+
+    from faster_whisper.audio import decode_audio
+
+    from open_dubbing.mixed_precision import autocast
+
     with warnings.catch_warnings():
         warnings.filterwarnings("ignore", category=UserWarning)
-        if device == "cuda":
-            pipeline.to(torch.device("cuda"))
-        diarization = pipeline(audio_file)
+        # Decoded once in memory, with a file path pyannote reads the file again
+        # for every window it crops
+        audio = decode_audio(audio_file, sampling_rate=_MODELS_SAMPLING_RATE)
+        audio_in_memory = {
+            "waveform": torch.from_numpy(audio).unsqueeze(0),
+            "sample_rate": _MODELS_SAMPLING_RATE,
+        }
+        # Not bfloat16, pyannote converts the embeddings to numpy that has no such type
+        with autocast(device, torch.float16):
+            diarization = pipeline(audio_in_memory)
         utterance_metadata = [
             {"start": segment.start, "end": segment.end, "speaker_id": speaker}
             for segment, _, speaker in diarization.itertracks(yield_label=True)
@@ -56,6 +109,73 @@ def create_pyannote_timestamps(
         return utterance_metadata
 
 
+def _cluster_speakers(
+    embeddings: np.ndarray, threshold: float = _SPEAKER_CLUSTERING_THRESHOLD
+) -> list[int]:
+    """Groups the speaker embeddings by cosine distance and returns a label per embedding."""
+    if len(embeddings) < 2:
+        return [0] * len(embeddings)
+
+    from scipy.cluster.hierarchy import fcluster, linkage
+
+    links = linkage(embeddings, method="average", metric="cosine")
+    labels = fcluster(links, t=threshold, criterion="distance")
+    return [int(label) - 1 for label in labels]
+
+
+def create_vad_timestamps(
+    *,
+    audio_file: str,
+    embedding_model: "Model",
+    device: str = "cpu",
+) -> Sequence[Mapping[str, float]]:
+    """Creates timestamps with voice activity detection and clustering of speaker embeddings.
+
+    Lighter alternative to create_pyannote_timestamps, the speech segments are
+    only split at pauses and not at speaker turns.
+
+    Returns:
+        A list of dictionaries containing start and end timestamps for each
+        speaker segment.
+    """
+    import torch
+
+    from faster_whisper.audio import decode_audio
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+    from pyannote.audio import Inference
+
+    audio = decode_audio(audio_file, sampling_rate=_MODELS_SAMPLING_RATE)
+    # Segments are limited to Whisper's 30 seconds window
+    speech_timestamps = get_speech_timestamps(
+        audio,
+        VadOptions(min_silence_duration_ms=500, max_speech_duration_s=30),
+    )
+
+    inference = Inference(embedding_model, window="whole", device=torch.device(device))
+    embeddings = []
+    for timestamp in speech_timestamps:
+        waveform = torch.from_numpy(audio[timestamp["start"] : timestamp["end"]])
+        embeddings.append(
+            inference(
+                {
+                    "waveform": waveform.unsqueeze(0),
+                    "sample_rate": _MODELS_SAMPLING_RATE,
+                }
+            )
+        )
+
+    labels = _cluster_speakers(np.vstack(embeddings)) if embeddings else []
+    utterance_metadata = [
+        {
+            "start": timestamp["start"] / _MODELS_SAMPLING_RATE,
+            "end": timestamp["end"] / _MODELS_SAMPLING_RATE,
+            "speaker_id": f"SPEAKER_{label:02d}",
+        }
+        for timestamp, label in zip(speech_timestamps, labels)
+    ]
+    return utterance_metadata
+
+
 def _cut_and_save_audio(
     *,
     audio: AudioSegment,
@@ -103,20 +223,83 @@ def run_cut_and_save_audio(
     audio = AudioSegment.from_file(audio_file)
     key = "path"
     prefix = "chunk"
-    updated_utterance_metadata = []
-    for utterance in utterance_metadata:
-        chunk_path = _cut_and_save_audio(
-            audio=audio,
-            utterance=utterance,
-            prefix=prefix,
-            output_directory=output_directory,
+
+    # The audio is decoded once and each chunk is encoded by its own ffmpeg
+    # process, so the chunks are saved in parallel
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        chunk_paths = list(
+            executor.map(
+                lambda utterance: _cut_and_save_audio(
+                    audio=audio,
+                    utterance=utterance,
+                    prefix=prefix,
+                    output_directory=output_directory,
+                ),
+                utterance_metadata,
+            )
         )
+
+    updated_utterance_metadata = []
+    for utterance, chunk_path in zip(utterance_metadata, chunk_paths):
         utterance_copy = utterance.copy()
         utterance_copy[key] = chunk_path
         updated_utterance_metadata.append(utterance_copy)
     return updated_utterance_metadata
 
 
+def _load_dubbed_chunk(item: Mapping[str, str | float]) -> AudioSegment | None:
+    _file = ""
+    try:
+        for_dubbing = item["for_dubbing"]
+        _file = item["dubbed_path"]
+
+        if for_dubbing is False:
+            start = int(item["start"])
+            end = int(item["end"])
+            logger().debug(
+                f"insert_audio_at_timestamps. Skipping {_file} at start time {start} and end at {end}"
+            )
+            return None
+
+        logger().debug(f"insert_audio_at_timestamps. Open: {_file}")
+        return AudioSegment.from_mp3(_file)
+    except Exception as e:
+        start = int(item["start"])
+        end = int(item["end"])
+        logger().error(
+            f"insert_audio_at_timestamps. Error on file: {_file} at start time {start} and end at {end}, error: {e}"
+        )
+        return None
+
+
+def _overlay_at_positions(
+    audio: AudioSegment, positioned_chunks: Sequence[tuple[int, AudioSegment]]
+) -> AudioSegment:
+    """Adds the chunks to the audio at the positions (in ms), like AudioSegment.overlay.
+
+    The samples are summed in a single buffer instead of creating a new copy of
+    the whole track for every chunk.
+    """
+    if not positioned_chunks:
+        return audio
+
+    audio, *chunks = AudioSegment._sync(
+        audio, *[chunk for _, chunk in positioned_chunks]
+    )
+    samples = np.array(audio.get_array_of_samples(), dtype=np.int64)
+    for (position, _), chunk in zip(positioned_chunks, chunks):
+        chunk_samples = np.array(chunk.get_array_of_samples(), dtype=np.int64)
+        start = int(position * audio.frame_rate / 1000) * audio.channels
+        end = min(len(samples), start + len(chunk_samples))
+        if start < end:
+            samples[start:end] += chunk_samples[: end - start]
+
+    # Saturates like audioop.add does when the sum overflows
+    limits = np.iinfo(np.dtype(audio.array_type))
+    samples = np.clip(samples, limits.min, limits.max)
+    return audio._spawn(samples.astype(audio.array_type).tobytes())
+
+
 def insert_audio_at_timestamps(
     *,
     utterance_metadata: Sequence[Mapping[str, str | float]],
@@ -127,32 +310,18 @@ def insert_audio_at_timestamps(
     background_audio = AudioSegment.from_mp3(background_audio_file)
     total_duration = background_audio.duration_seconds
     output_audio = AudioSegment.silent(duration=total_duration * 1000)
-    for item in utterance_metadata:
-        _file = ""
-        try:
-            for_dubbing = item["for_dubbing"]
-            _file = item["dubbed_path"]
-
-            if for_dubbing is False:
-                start = int(item["start"])
-                end = int(item["end"])
-                logger().debug(
-                    f"insert_audio_at_timestamps. Skipping {_file} at start time {start} and end at {end}"
-                )
-                continue
-
-            start_time = int(item["start"] * 1000)
-            logger().debug(f"insert_audio_at_timestamps. Open: {_file}")
-            audio_chunk = AudioSegment.from_mp3(_file)
-            output_audio = output_audio.overlay(
-                audio_chunk, position=start_time, loop=False
-            )
-        except Exception as e:
-            start = int(item["start"])
-            end = int(item["end"])
-            logger().error(
-                f"insert_audio_at_timestamps. Error on file: {_file} at start time {start} and end at {end}, error: {e}"
-            )
+
+    # Each chunk is decoded by its own ffmpeg process, so they are read in
+    # parallel
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        audio_chunks = executor.map(_load_dubbed_chunk, utterance_metadata)
+        positioned_chunks = [
+            (int(item["start"] * 1000), audio_chunk)
+            for item, audio_chunk in zip(utterance_metadata, audio_chunks)
+            if audio_chunk is not None
+        ]
+
+    output_audio = _overlay_at_positions(output_audio, positioned_chunks)
 
     dubbed_vocals_audio_file = os.path.join(
         output_directory, _DEFAULT_DUBBED_VOCALS_AUDIO_FILE
@@ -164,24 +333,11 @@ def insert_audio_at_timestamps(
 def _needs_background_normalization(
     *, background_audio_file: str, threshold: float = 0.1
 ):
+    # The peak is computed over the decoded 16-bit PCM samples in a single pass,
+    # without converting the audio to floating point
     try:
-        chunk_size = 1024
-        fps = 44100
-
-        clip = AudioFileClip(background_audio_file)
-        duration = clip.duration
-        num_chunks = int(duration * fps / chunk_size)
-
-        max_amplitude = 0
-
-        for i in range(num_chunks):
-            start = i * chunk_size / fps
-            end = (i + 1) * chunk_size / fps
-            audio_chunk = clip.subclipped(start, end).to_soundarray(fps=fps)
-
-            # Calculate maximum amplitude of this chunk
-            chunk_amplitude = np.abs(audio_chunk).max(axis=1).max()
-            max_amplitude = max(max_amplitude, chunk_amplitude)
+        background = AudioSegment.from_file(background_audio_file)
+        max_amplitude = background.max / background.max_possible_amplitude
 
         needs = max_amplitude > threshold
         logger().debug(
@@ -193,9 +349,6 @@ def _needs_background_normalization(
         logger().error(f"_needs_background_normalization. Error: {e}")
         return True, 1.0
 
-    finally:
-        clip.close()
-
 
 def merge_background_and_vocals(
     *,
@@ -0,0 +1,104 @@
+# Copyright 2024 Jordi Mas i Hernàndez <jmas@softcatala.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import functools
+import hashlib
+import os
+import sqlite3
+import threading
+
+from typing import Callable, Final, Mapping
+
+from open_dubbing import logger
+
+_CACHE_FILENAME: Final[str] = ".cache.sqlite"
+_FILE_HASH_CHUNK_SIZE: Final[int] = 16 * 1024 * 1024
+
+
+def get_file_hash(path: str) -> str:
+    """Returns a hash of the whole content of the file.
+
+    Hashing a video takes a while, it is done only once per process for the
+    same file, size and modification time.
+    """
+    stat = os.stat(path)
+    return _get_file_hash(os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=32)
+def _get_file_hash(path: str, size: int, mtime_ns: int) -> str:
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as _file:
+        while chunk := _file.read(_FILE_HASH_CHUNK_SIZE):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+class Cache:
+    """Keeps results that are expensive to compute (e.g. detected language, translations) between runs.
+
+    The values are stored in a SQLite database in the output directory.
+    """
+
+    def __init__(self, directory: str):
+        self.path = os.path.join(directory, _CACHE_FILENAME)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT)"
+            )
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)",
+                (key, value),
+            )
+
+    def set_many(self, items: Mapping[str, str]) -> None:
+        """Stores several values in a single transaction."""
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)",
+                items.items(),
+            )
+
+    def get_or_compute(self, key: str, compute: Callable[[], str]) -> str:
+        value = self.get(key)
+        if value is not None:
+            logger().debug(f"cache.get_or_compute. Using cached value for '{key}'")
+            return value
+
+        value = compute()
+        if value is not None:
+            self.set(key, value)
+        return value
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def __enter__(self) -> "Cache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
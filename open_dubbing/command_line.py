@@ -13,30 +13,76 @@
 # limitations under the License.
 
 import argparse
+import re
 
 WHISPER_MODEL_NAMES = [
     "medium",
     "large-v2",
     "large-v3",
+    "large-v3-turbo",
 ]
 
+COMPUTE_TYPES = [
+    "int8",
+    "int8_float16",
+    "float16",
+    "bfloat16",
+    "float32",
+]
+
+NLLB_QUANTIZATIONS = [
+    "int8",
+    "int8_float16",
+    "float16",
+    "float32",
+]
+
+DEVICE_MAP_STAGES = [
+    "demucs",
+    "diarization",
+    "tts",
+]
+
+
+def _device_map(value: str) -> dict:
+    device_map = {}
+    for entry in value.split(","):
+        stage, _, device = entry.partition("=")
+        if stage not in DEVICE_MAP_STAGES or not re.fullmatch(
+            r"cpu|cuda(:\d+)?", device
+        ):
+            raise argparse.ArgumentTypeError(f"invalid device map entry '{entry}'")
+        device_map[stage] = device
+    return device_map
+
+
+def _positive_int(value: str) -> int:
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"'{value}' is not a positive integer")
+    return number
+
 
 class NewlinePreservingHelpFormatter(argparse.HelpFormatter):
     def _split_lines(self, text, width):
-        # Split the text by explicit newlines first
-        lines = text.splitlines()
-        # Then apply the default behavior for line wrapping
-        wrapped_lines = []
-        for line in lines:
-            wrapped_lines.extend(argparse.HelpFormatter._split_lines(self, line, width))
-        return wrapped_lines
+        # Split the text by explicit newlines first and then apply the default
+        # behavior for line wrapping
+        split_lines = super()._split_lines
+        return [
+            wrapped
+            for line in text.splitlines()
+            for wrapped in split_lines(line, width)
+        ]
 
 
 class CommandLine:
 
     @staticmethod
-    def read_parameters():
-        """Parses command-line arguments and runs the dubbing process."""
+    def read_parameters(argv=None):
+        """Parses command-line arguments (from sys.argv when argv is None) and runs the dubbing process."""
         parser = argparse.ArgumentParser(
             description="AI dubbing system which uses machine learning models to automatically translate and synchronize audio dialogue into different languages",
             formatter_class=NewlinePreservingHelpFormatter,
@@ -89,19 +135,55 @@ class CommandLine:
             "--stt",
             type=str,
             default="auto",
-            choices=["auto", "faster-whisper", "transformers", "openai-whisper"],
+            choices=[
+                "auto",
+                "faster-whisper",
+                "transformers",
+                "openai-whisper",
+                "onnx",
+            ],
             help=(
                 "Speech to text. Choices are:\n"
                 "'auto': Autoselect best implementation.\n"
                 "'faster-whisper': Faster-whisper's OpenAI whisper implementation.\n"
                 "'transformers': Transformers OpenAI whisper implementation.\n"
                 "'openai-whisper': OpenAI Whisper API implementation.\n"
+                "'onnx': Transformers OpenAI whisper exported to ONNX Runtime.\n"
             ),
         )
         parser.add_argument(
             "--vad",
             action="store_true",
-            help="Enable VAD filter when using faster-whisper (reduces hallucinations).",
+            help="Enable VAD filter when using faster-whisper (reduces hallucinations). Same as '--vad_method silero'.",
+        )
+        parser.add_argument(
+            "--vad_method",
+            default=None,
+            choices=["off", "silero", "webrtc"],
+            help=(
+                "Voice activity detection used by faster-whisper. Choices are:\n"
+                "'off': No voice activity detection (default).\n"
+                "'silero': Silero VAD neural model.\n"
+                "'webrtc': WebRTC VAD, much faster on CPU (requires 'pip install open-dubbing[webrtc]').\n"
+            ),
+        )
+
+        parser.add_argument(
+            "--diarization",
+            default="pyannote",
+            choices=["pyannote", "vad"],
+            help=(
+                "Method used to split the audio in utterances and identify the speakers. Choices are:\n"
+                "'pyannote': Pyannote speaker diarization (default).\n"
+                "'vad': Silero voice activity detection and clustering of speaker embeddings.\n"
+                "Faster on CPU, but utterances are only split at pauses and not at speaker turns.\n"
+            ),
+        )
+
+        parser.add_argument(
+            "--quantize_diarization",
+            action="store_true",
+            help="Run the Pyannote speaker embedding model with int8 quantized linear layers on CPU. Faster, but the speakers identified may change",
         )
 
         parser.add_argument(
@@ -126,14 +208,43 @@ class CommandLine:
             "--device",
             type=str,
             default="cpu",
-            choices=["cpu", "cuda"],
-            help=("Device to use"),
+            choices=["cpu", "cuda", "auto"],
+            help=("Device to use. 'auto' uses cuda when it is available"),
+        )
+        parser.add_argument(
+            "--device_map",
+            type=_device_map,
+            default={},
+            help=(
+                "Devices used by specific stages instead of '--device', as comma separated stage=device pairs.\n"
+                "Stages are 'demucs', 'diarization' and 'tts'. For example: 'demucs=cuda:1,tts=cuda:1'."
+            ),
+        )
+        parser.add_argument(
+            "--sequential_preprocessing",
+            action="store_true",
+            help="Run Demucs and the diarization one after the other instead of at the same time, for GPUs without memory for both",
         )
         parser.add_argument(
             "--cpu_threads",
             type=int,
             default=0,
-            help="number of threads used for CPU inference (if is not specified uses defaults for each framework)",
+            help="number of threads used for CPU inference by torch, OpenMP, CTranslate2 and ONNX Runtime (if is not specified uses defaults for each framework)",
+        )
+        parser.add_argument(
+            "--compute_type",
+            default=None,
+            choices=COMPUTE_TYPES,
+            help=(
+                "Numeric precision used by faster-whisper for inference.\n"
+                "If is not specified uses 'int8' for CPU and 'float16' for CUDA.\n"
+                "Half precision types are usually slower than 'int8' on CPU."
+            ),
+        )
+        parser.add_argument(
+            "--model_cache_dir",
+            default=None,
+            help="Directory where the downloaded and converted models are cached (if is not specified uses the defaults for each framework)",
         )
         parser.add_argument(
             "--clean-intermediate-files",
@@ -151,6 +262,57 @@ class CommandLine:
             "'nllb-200-1.3B': is the fastest.\n",
         )
 
+        parser.add_argument(
+            "--nllb_quantization",
+            default=None,
+            choices=NLLB_QUANTIZATIONS,
+            help=(
+                "Runs Meta NLLB translation model with CTranslate2 using the given quantization.\n"
+                "The model is converted the first time and cached. If is not specified uses Transformers."
+            ),
+        )
+
+        parser.add_argument(
+            "--stt_batch_size",
+            type=_positive_int,
+            default=16,
+            help="number of utterances transcribed together in a single inference call by faster-whisper and Transformers",
+        )
+        parser.add_argument(
+            "--translation_batch_size",
+            type=_positive_int,
+            default=16,
+            help="number of sentences translated together by NLLB in a single inference call",
+        )
+        parser.add_argument(
+            "--tts_concurrency",
+            type=_positive_int,
+            default=4,
+            help="number of utterances converted to speech at the same time",
+        )
+        parser.add_argument(
+            "--resume",
+            action=argparse.BooleanOptionalAction,
+            default=False,
+            help="Reuse the preprocessing, speech to text and translation of a previous interrupted run of the same input file and options",
+        )
+        parser.add_argument(
+            "--tts_stream",
+            action="store_true",
+            help="Write the speech audio while it is received from the 'openai' and 'api' tts instead of when it is complete",
+        )
+        parser.add_argument(
+            "--video_codec",
+            default="copy",
+            choices=["copy", "libx264"],
+            help=(
+                "Codec used to write the video stream. Choices are:\n"
+                "'copy': Copies the original video stream without re-encoding it (fastest).\n"
+                "Streams that cannot be copied into the mp4 output (e.g. VP8 or ProRes) are encoded with H.264.\n"
+                "'libx264': Re-encodes the video with H.264.\n"
+            ),
+        )
+
         parser.add_argument(
             "--whisper_model",
             default="large-v3",
@@ -158,6 +320,13 @@ class CommandLine:
             help="name of the OpenAI Whisper speech to text model size to use",
         )
 
+        parser.add_argument(
+            "--whisper_beam_size",
+            type=int,
+            default=1,
+            help="beam size used by Whisper when decoding (1 uses greedy decoding, which is the fastest)",
+        )
+
         parser.add_argument(
             "--target_language_region",
             default="",
@@ -201,4 +370,4 @@ class CommandLine:
             help="Add dubbed subtitles as stream in the output video",
         )
 
-        return parser.parse_args()
+        return parser.parse_args(argv)
@@ -13,25 +13,28 @@
 # limitations under the License.
 
 import dataclasses
+import errno
 import functools
+import json
 import logging
 import os
 import re
 import shutil
 import sys
+import tempfile
 import time
 
-from typing import Final
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Final
 
 import psutil
-import torch
-
-from pyannote.audio import Pipeline
 
 from open_dubbing import audio_processing, logger
+from open_dubbing.cache import Cache
 from open_dubbing.demucs import Demucs
 from open_dubbing.exit_code import ExitCode
 from open_dubbing.ffmpeg import FFmpeg
+from open_dubbing.model_registry import ModelRegistry
 from open_dubbing.preprocessing import PreprocessingArtifacts
 from open_dubbing.speech_to_text import SpeechToText
 from open_dubbing.subtitles import Subtitles
@@ -40,8 +43,33 @@ from open_dubbing.translation import Translation
 from open_dubbing.utterance import Utterance
 from open_dubbing.video_processing import VideoProcessing
 
+# torch and pyannote are imported when used, loading them takes seconds
+if TYPE_CHECKING:
+    from pyannote.audio import Model, Pipeline
+
 _DEFAULT_PYANNOTE_MODEL: Final[str] = "pyannote/speaker-diarization-3.1"
+_DEFAULT_SPEAKER_EMBEDDING_MODEL: Final[str] = "pyannote/wespeaker-voxceleb-resnet34-LM"
 _NUMBER_OF_STEPS: Final[int] = 7
+_CLEANING_WORKERS: Final[int] = 32
+_NOT_LOWERCASE_ALPHANUMERIC: Final[re.Pattern] = re.compile(r"[^a-z0-9]+")
+_IS_WINDOWS: Final[bool] = sys.platform == "win32"
+# ru_maxrss is in bytes on macOS and in kilobytes on Linux
+_MAXRSS_UNITS_PER_MB: Final[int] = 1024**2 if sys.platform == "darwin" else 1024
+# Stages whose results are saved in resume_dir, in the order they run
+_RESUMABLE_STAGES: Final[tuple[str, ...]] = ("preprocessing", "stt", "translation")
+
+
+def _inference_mode(method):
+    """Runs the method under torch.inference_mode, importing torch only when called."""
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        import torch
+
+        with torch.inference_mode():
+            return method(*args, **kwargs)
+
+    return wrapper
 
 
 @dataclasses.dataclass
@@ -74,7 +102,7 @@ def rename_input_file(original_input_file: str) -> str:
     """
     directory, filename = os.path.split(original_input_file)
     base_name, extension = os.path.splitext(filename)
-    normalized_name = re.sub(r"[^a-z0-9]", "", base_name.lower())
+    normalized_name = _NOT_LOWERCASE_ALPHANUMERIC.sub("", base_name.lower())
     return os.path.join(directory, normalized_name + extension)
 
 
@@ -84,7 +112,21 @@ def overwrite_input_file(input_file: str, updated_input_file: str) -> None:
     if not os.path.exists(input_file):
         raise FileNotFoundError(f"File '{input_file}' not found.")
 
-    shutil.move(input_file, updated_input_file)
+    # A single rename system call when both are in the same file system, the
+    # file is only copied when moving it to another one
+    try:
+        os.replace(input_file, updated_input_file)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(input_file, updated_input_file)
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
 
 
 class Dubber:
@@ -103,10 +145,19 @@ class Dubber:
         translation: Translation,
         stt: SpeechToText,
         device: str,
+        device_map: dict[str, str] | None = None,
         cpu_threads: int = 0,
         clean_intermediate_files: bool = False,
         original_subtitles: bool = False,
         dubbed_subtitles: bool = False,
+        tts_concurrency: int = 1,
+        video_codec: str = "copy",
+        diarization: str = "pyannote",
+        quantize_diarization: bool = False,
+        sequential_preprocessing: bool = False,
+        stt_batch_size: int = 16,
+        cache: Cache | None = None,
+        resume_dir: str | None = None,
     ) -> None:
         self._input_file = input_file
         self.output_directory = output_directory
@@ -121,15 +172,37 @@ class Dubber:
         self.translation = translation
         self.stt = stt
         self.device = device
+        self.device_map = device_map or {}
         self.cpu_threads = cpu_threads
         self.clean_intermediate_files = clean_intermediate_files
         self.preprocessing_output = None
         self.original_subtitles = original_subtitles
         self.dubbed_subtitles = dubbed_subtitles
+        self.tts_concurrency = tts_concurrency
+        self.video_codec = video_codec
+        self.diarization = diarization
+        self.quantize_diarization = quantize_diarization
+        self.sequential_preprocessing = sequential_preprocessing
+        self.stt_batch_size = stt_batch_size
+        self.cache = cache
+        self.resume_dir = resume_dir
 
         if cpu_threads > 0:
+            import torch
+
             torch.set_num_threads(cpu_threads)
 
+        if any(
+            stage_device.startswith("cuda")
+            for stage_device in [device, *self.device_map.values()]
+        ):
+            from open_dubbing.mixed_precision import enable_tf32
+
+            enable_tf32()
+
+    def _get_device(self, stage: str) -> str:
+        return self.device_map.get(stage, self.device)
+
     @functools.cached_property
     def input_file(self):
         renamed_input_file = rename_input_file(self._input_file)
@@ -145,35 +218,106 @@ class Dubber:
         return renamed_input_file
 
     def log_maxrss_memory(self):
-        if sys.platform == "win32" or sys.platform == "win64":
+        if _IS_WINDOWS:
             return
 
         import resource
 
-        max_rss_self = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
-        if sys.platform == "darwin":
-            return max_rss_self / 1024
-
+        max_rss_self = (
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / _MAXRSS_UNITS_PER_MB
+        )
         logger().info(f"Maximum memory used: {max_rss_self:.0f} MB")
 
+    @functools.cached_property
+    def _process(self) -> psutil.Process:
+        return psutil.Process(os.getpid())
+
     def log_debug_task_and_getime(self, text, start_time):
-        process = psutil.Process(os.getpid())
-        current_rss = process.memory_info().rss / 1024**2
+        current_rss = self._process.memory_info().rss / 1024**2
         _time = time.time() - start_time
         logger().info(
             f"Completed task '{text}': current_rss {current_rss:.2f} MB, time {_time:.2f}s"
         )
         return _time
 
+    def log_execution_times(self, times, start_time):
+        logger().info("Dubbing process finished.")
+        total_time = time.time() - start_time
+        logger().info(f"Total execution time: {total_time:.2f} secs")
+        for task in times:
+            _time = times[task]
+            per = _time * 100 / total_time
+            logger().info(f" Task '{task}' in {_time:.2f} secs ({per:.2f}%)")
+
+        self.log_maxrss_memory()
+
     @functools.cached_property
-    def pyannote_pipeline(self) -> Pipeline:
-        """Loads the PyAnnote diarization pipeline."""
-        return Pipeline.from_pretrained(
-            self.pyannote_model, use_auth_token=self.hugging_face_token
+    def utterance(self) -> Utterance:
+        return Utterance(self.target_language, self.output_directory)
+
+    @functools.cached_property
+    def pyannote_pipeline(self) -> "Pipeline":
+        """Loads the PyAnnote diarization pipeline on the diarization device."""
+        device = self._get_device("diarization")
+        quantize = self.quantize_diarization and device == "cpu"
+
+        def _load():
+            import torch
+
+            from pyannote.audio import Pipeline
+
+            from open_dubbing import pyannote_optim
+
+            pipeline = Pipeline.from_pretrained(
+                self.pyannote_model, use_auth_token=self.hugging_face_token
+            )
+            # None is returned when there is no access to the model
+            if pipeline:
+                pipeline.to(torch.device(device))
+                if quantize:
+                    pyannote_optim.quantize_embedding_model(pipeline)
+                audio_processing.skip_inactive_speakers_embeddings(pipeline)
+            return pipeline
+
+        return ModelRegistry.get(
+            "pyannote",
+            (self.pyannote_model, self.hugging_face_token, device, quantize),
+            _load,
+        )
+
+    @functools.cached_property
+    def speaker_embedding_model(self) -> "Model":
+        """Loads the speaker embedding model used by the 'vad' diarization."""
+        from pyannote.audio import Model
+
+        return ModelRegistry.get(
+            "speaker_embedding",
+            (_DEFAULT_SPEAKER_EMBEDDING_MODEL, self.hugging_face_token),
+            lambda: Model.from_pretrained(
+                _DEFAULT_SPEAKER_EMBEDDING_MODEL,
+                use_auth_token=self.hugging_face_token,
+            ),
+        )
+
+    def _create_timestamps(self, audio_file: str):
+        if self.diarization == "vad":
+            return audio_processing.create_vad_timestamps(
+                audio_file=audio_file,
+                embedding_model=self.speaker_embedding_model,
+                device=self._get_device("diarization"),
+            )
+
+        return audio_processing.create_pyannote_timestamps(
+            audio_file=audio_file,
+            pipeline=self.pyannote_pipeline,
+            device=self._get_device("diarization"),
         )
 
     def _verify_api_access(self) -> None:
         """Verifies access to all the required APIs."""
+        if self.diarization != "pyannote":
+            return
+
         logger().debug("Verifying access to PyAnnote from HuggingFace.")
         if not self.pyannote_pipeline:
             raise PyAnnoteAccessError(
@@ -187,32 +331,47 @@ class Dubber:
             )
         logger().debug("Access to PyAnnote from HuggingFace verified.")
 
+    def _warmup_models(self) -> None:
+        try:
+            self.stt.warmup()
+            self.tts.warmup(target_language=self.target_language)
+        except Exception as e:
+            # They are loaded again, reporting the error, when they are used
+            logger().warning(f"dubbing._warmup_models. Error: '{e}'")
+
     def run_preprocessing(self) -> None:
         """Splits audio/video, applies DEMUCS, and segments audio into utterances with PyAnnote."""
         video_file, audio_file = VideoProcessing.split_audio_video(
-            video_file=self.input_file, output_directory=self.output_directory
+            video_file=self.input_file,
+            output_directory=self.output_directory,
+            video_codec=self.video_codec,
         )
         demucs = Demucs()
         demucs_command = demucs.build_demucs_command(
             audio_file=audio_file,
             output_directory=self.output_directory,
-            device=self.device,
+            device=self._get_device("demucs"),
         )
-        demucs.execute_demucs_command(command=demucs_command)
         audio_vocals_file, audio_background_file = (
             demucs.assemble_split_audio_file_paths(command=demucs_command)
         )
 
-        utterance_metadata = audio_processing.create_pyannote_timestamps(
-            audio_file=audio_file,
-            pipeline=self.pyannote_pipeline,
-            device=self.device,
-        )
-        utterance_metadata = audio_processing.run_cut_and_save_audio(
-            utterance_metadata=utterance_metadata,
-            audio_file=audio_file,
-            output_directory=self.output_directory,
-        )
+        # Demucs runs in its own process and the diarization only needs the
+        # original audio, so the source separation overlaps with it unless
+        # both do not fit at the same time in the memory of the device
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            demucs_future = executor.submit(
+                demucs.execute_demucs_command, command=demucs_command
+            )
+            if self.sequential_preprocessing:
+                demucs_future.result()
+            utterance_metadata = self._create_timestamps(audio_file)
+            utterance_metadata = audio_processing.run_cut_and_save_audio(
+                utterance_metadata=utterance_metadata,
+                audio_file=audio_file,
+                output_directory=self.output_directory,
+            )
+            demucs_future.result()
         self.utterance_metadata = utterance_metadata
         self.preprocessing_output = PreprocessingArtifacts(
             video_file=video_file,
@@ -237,6 +396,7 @@ class Dubber:
             utterance_metadata=self.utterance_metadata,
             source_language=self.source_language,
             no_dubbing_phrases=[],
+            batch_size=self.stt_batch_size,
         )
         speaker_info = self.stt.predict_gender(
             file=media_file,
@@ -246,7 +406,7 @@ class Dubber:
             utterance_metadata=utterance_metadata, speaker_info=speaker_info
         )
 
-        utterance = Utterance(self.target_language, self.output_directory)
+        utterance = self.utterance
         self.utterance_metadata = utterance.get_without_empty_blocks(
             self.utterance_metadata
         )
@@ -258,6 +418,7 @@ class Dubber:
             utterance_metadata=self.utterance_metadata,
             source_language=self.source_language,
             target_language=self.target_language,
+            cache=self.cache,
         )
 
     def run_configure_text_to_speech(self) -> None:
@@ -277,37 +438,44 @@ class Dubber:
             assigned_voices=assigned_voices,
         )
 
-    def run_text_to_speech(self) -> None:
-        """Converts translated text to speech and dubs utterance"""
+    def run_text_to_speech(self, modified_metadata=None) -> None:
+        """Converts translated text to speech and dubs utterance
+
+        When modified_metadata is given only these utterances are dubbed again.
+        """
         self.utterance_metadata = self.tts.dub_utterances(
             utterance_metadata=self.utterance_metadata,
             output_directory=self.output_directory,
             target_language=self.target_language,
             audio_file=self.preprocessing_output.audio_file,
+            modified_metadata=modified_metadata,
+            concurrency=self.tts_concurrency,
         )
 
     def run_cleaning(self) -> None:
         if not self.clean_intermediate_files:
             return
 
-        output_directory = None
-        paths, dubbed_paths = Utterance(
-            self.target_language, self.output_directory
-        ).get_files_paths(self.utterance_metadata)
-        for path in paths + dubbed_paths:
-            if os.path.exists(path):
-                os.remove(path)
-            if not output_directory:
-                output_directory = os.path.dirname(path)
-
-        if output_directory:
-            for path in [
-                f"dubbed_audio_{self.target_language}.mp3",
-                "dubbed_vocals.mp3",
-            ]:
-                full_path = os.path.join(output_directory, path)
-                if os.path.exists(full_path):
-                    os.remove(full_path)
+        paths, dubbed_paths = self.utterance.get_files_paths(self.utterance_metadata)
+        paths = paths + dubbed_paths
+        if paths:
+            output_directory = os.path.dirname(paths[0])
+            paths += [
+                os.path.join(output_directory, path)
+                for path in [
+                    f"dubbed_audio_{self.target_language}.mp3",
+                    "dubbed_vocals.mp3",
+                ]
+            ]
+
+        # Utterances that are not dubbed have the same path as their dubbed
+        # path, each file is unlinked only once
+        paths = list(dict.fromkeys(paths))
+
+        # The deletions are independent, so their latency overlaps on slow
+        # or network file systems
+        with ThreadPoolExecutor(max_workers=_CLEANING_WORKERS) as executor:
+            list(executor.map(_remove_file, paths))
 
     def run_postprocessing(self) -> None:
         """Merges dubbed audio with the original background audio and video (if applicable).
@@ -337,24 +505,95 @@ class Dubber:
             dubbed_audio_file=dubbed_audio_file,
             output_directory=self.output_directory,
             target_language=self.target_language,
+            video_codec=self.video_codec,
         )
         self.postprocessing_output = PostprocessingArtifacts(
             audio_file=dubbed_audio_file,
             video_file=dubbed_video_file,
         )
 
+    def _save_stage(self, stage: str) -> None:
+        """Saves the results of a completed stage, to resume from it if the run is interrupted."""
+        if not self.resume_dir:
+            return
+
+        os.makedirs(self.resume_dir, exist_ok=True)
+        data = {
+            "utterances": self.utterance_metadata,
+            "PreprocessingArtifacts": dataclasses.asdict(self.preprocessing_output),
+        }
+        with tempfile.NamedTemporaryFile(
+            mode="w", delete=False, encoding="utf-8", dir=self.resume_dir
+        ) as temporary_file:
+            json.dump(data, temporary_file, ensure_ascii=False)
+        os.replace(temporary_file.name, os.path.join(self.resume_dir, f"{stage}.json"))
+
+    def _load_stage(self, stage: str) -> bool:
+        filename = os.path.join(self.resume_dir, f"{stage}.json")
+        if not os.path.exists(filename):
+            return False
+
+        with open(filename, "r", encoding="utf-8") as _file:
+            data = json.load(_file)
+
+        preprocessing_output = PreprocessingArtifacts(**data["PreprocessingArtifacts"])
+        utterance_metadata = data["utterances"]
+        # The intermediate files may have been cleaned after the run
+        files = [
+            *[path for path in dataclasses.astuple(preprocessing_output) if path],
+            *[utterance["path"] for utterance in utterance_metadata],
+        ]
+        if not all(os.path.exists(path) for path in files):
+            return False
+
+        self.preprocessing_output = preprocessing_output
+        self.utterance_metadata = utterance_metadata
+        return True
+
+    def _resume(self) -> int:
+        """Restores the last stage completed in a previous run with the same input and options.
+
+        Returns:
+            The number of stages that do not need to run again.
+        """
+        if not self.resume_dir:
+            return 0
+
+        for idx in reversed(range(len(_RESUMABLE_STAGES))):
+            stage = _RESUMABLE_STAGES[idx]
+            if self._load_stage(stage):
+                logger().warning(
+                    f"Reusing the results up to the '{stage}' stage of a previous run saved in '{self.resume_dir}'"
+                )
+                return idx + 1
+        return 0
+
+    def _remove_stages(self) -> None:
+        """Removes the stages saved by the run, once it has completed."""
+        if not self.resume_dir:
+            return
+
+        shutil.rmtree(self.resume_dir, ignore_errors=True)
+        try:
+            # The directory of all the runs, only when no other run left stages
+            os.rmdir(os.path.dirname(self.resume_dir))
+        except OSError:
+            pass
+
     def _save_utterances(self):
         metadata = {
             "source_language": self.source_language,
             "original_subtitles": self.original_subtitles,
             "dubbed_subtitles": self.dubbed_subtitles,
         }
-        Utterance(self.target_language, self.output_directory).save_utterances(
+        self.utterance.save_utterances(
             utterance_metadata=self.utterance_metadata,
             preprocessing_output=self.preprocessing_output,
             metadata=metadata,
         )
 
+    # Nothing is trained, so autograd is not tracked in any of the steps
+    @_inference_mode
     def update(self):
         times = {}
         start_time = time.time()
@@ -363,7 +602,7 @@ class Dubber:
         logger().info("Update dubbing process started")
 
         try:
-            utterance = Utterance(self.target_language, self.output_directory)
+            utterance = self.utterance
             self.utterance_metadata, self.preprocessing_output, _ = (
                 utterance.load_utterances()
             )
@@ -372,7 +611,7 @@ class Dubber:
                 f"Unable to read metadata at '{self.output_directory}. "
                 f"Cannot find a previous execution to update. Error: '{e}'"
             )
-            exit(ExitCode.UPDATE_MISSING_FILES)
+            raise SystemExit(int(ExitCode.UPDATE_MISSING_FILES))
 
         _, dubbed_paths = utterance.get_files_paths(self.utterance_metadata)
         for path in dubbed_paths:
@@ -380,7 +619,7 @@ class Dubber:
                 logger().error(
                     f"Cannot do update operation since file '{path}' is missing."
                 )
-                exit(ExitCode.UPDATE_MISSING_FILES)
+                raise SystemExit(int(ExitCode.UPDATE_MISSING_FILES))
 
         # Update voices in case voices, text or time has changed
         modified_utterances = utterance.get_modified_utterances(self.utterance_metadata)
@@ -397,13 +636,7 @@ class Dubber:
             assigned_voices=assigned_voices,
         )
 
-        self.utterance_metadata = self.tts.dub_utterances(
-            utterance_metadata=self.utterance_metadata,
-            output_directory=self.output_directory,
-            target_language=self.target_language,
-            audio_file=self.preprocessing_output.audio_file,
-            modified_metadata=modified_utterances,
-        )
+        self.run_text_to_speech(modified_metadata=modified_utterances)
         times["tts"] = self.log_debug_task_and_getime(
             "Text to speech completed", task_start_time
         )
@@ -415,15 +648,7 @@ class Dubber:
         times["postprocessing"] = self.log_debug_task_and_getime(
             "Post processing completed", task_start_time
         )
-        logger().info("Dubbing process finished.")
-        total_time = time.time() - start_time
-        logger().info(f"Total execution time: {total_time:.2f} secs")
-        for task in times:
-            _time = times[task]
-            per = _time * 100 / total_time
-            logger().info(f" Task '{task}' in {_time:.2f} secs ({per:.2f}%)")
-
-        self.log_maxrss_memory()
+        self.log_execution_times(times, start_time)
         logger().info("Output files saved in: %s.", self.output_directory)
 
     def run_generate_subtitles(self):
@@ -466,6 +691,7 @@ class Dubber:
         )
         logger().info(f"Generated subtitles for languages {languages_iso_639_3}")
 
+    @_inference_mode
     def dub(self) -> PostprocessingArtifacts:
         """Orchestrates the entire dubbing process."""
         self._verify_api_access()
@@ -473,23 +699,36 @@ class Dubber:
         times = {}
         start_time = time.time()
 
-        task_start_time = time.time()
-        self.run_preprocessing()
-        times["preprocessing"] = self.log_debug_task_and_getime(
-            "Preprocessing completed", task_start_time
-        )
-        logger().info("Speech to text...")
-        task_start_time = time.time()
-        self.run_speech_to_text()
-        times["stt"] = self.log_debug_task_and_getime(
-            "Speech to text completed", task_start_time
-        )
-        task_start_time = time.time()
+        resumed_stages = self._resume()
+        if resumed_stages < 1:
+            task_start_time = time.time()
+            # The models that are loaded the first time they are used are loaded
+            # meanwhile, unless the device has no memory to spare for them
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                if not self.sequential_preprocessing:
+                    executor.submit(self._warmup_models)
+                self.run_preprocessing()
+            self._save_stage("preprocessing")
+            times["preprocessing"] = self.log_debug_task_and_getime(
+                "Preprocessing completed", task_start_time
+            )
 
-        self.run_translation()
-        times["translation"] = self.log_debug_task_and_getime(
-            "Translation completed", task_start_time
-        )
+        if resumed_stages < 2:
+            logger().info("Speech to text...")
+            task_start_time = time.time()
+            self.run_speech_to_text()
+            self._save_stage("stt")
+            times["stt"] = self.log_debug_task_and_getime(
+                "Speech to text completed", task_start_time
+            )
+
+        if resumed_stages < 3:
+            task_start_time = time.time()
+            self.run_translation()
+            self._save_stage("translation")
+            times["translation"] = self.log_debug_task_and_getime(
+                "Translation completed", task_start_time
+            )
 
         task_start_time = time.time()
         self.run_configure_text_to_speech()
@@ -504,18 +743,11 @@ class Dubber:
         self.run_generate_subtitles()
         self._save_utterances()
         self.run_cleaning()
+        self._remove_stages()
         times["postprocessing"] = self.log_debug_task_and_getime(
             "Post processing completed", task_start_time
         )
-        logger().info("Dubbing process finished.")
-        total_time = time.time() - start_time
-        logger().info(f"Total execution time: {total_time:.2f} secs")
-        for task in times:
-            _time = times[task]
-            per = _time * 100 / total_time
-            logger().info(f" Task '{task}' in {_time:.2f} secs ({per:.2f}%)")
-
-        self.log_maxrss_memory()
+        self.log_execution_times(times, start_time)
         if logger().getEffectiveLevel() == logging.getLevelName("DEBUG"):
             self.stt.dump_transcriptions(
                 output_directory=self.output_directory,
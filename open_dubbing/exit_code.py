@@ -30,3 +30,5 @@ class ExitCode(IntEnum):
     UPDATE_MISSING_FILES = 111
     NO_OPENAI_TTS = 112
     NO_OPENAI_KEY = 113
+    NO_ONNX_RUNTIME = 114
+    NO_WEBRTCVAD = 115
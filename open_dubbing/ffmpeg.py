@@ -12,81 +12,233 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import functools
+import math
 import os
 import shutil
 import subprocess
 import tempfile
 
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Final, List, Tuple
 
 from open_dubbing import logger
 
+# Bounds the number of files opened by each FFmpeg process
+_MAX_FILES_PER_PROCESS: Final[int] = 16
+
+# Output option that lets FFmpeg pick the number of encoding threads from the available cores
+_ENCODER_THREADS: Final[List[str]] = ["-threads", "0"]
+
+
+@functools.lru_cache(maxsize=None)
+def _get_binary(name: str) -> str:
+    """Returns the absolute path of the tool, looked up in PATH only once."""
+    return shutil.which(name) or name
+
 
 class FFmpeg:
 
     def _run(self, *, command: List[str], fail: bool = True):
-        with open(os.devnull, "wb") as devnull:
-            try:
-                result = subprocess.run(command, stdout=devnull, stderr=subprocess.PIPE)
-                if result.returncode != 0:
-                    raise subprocess.CalledProcessError(result.returncode, command)
-            except subprocess.CalledProcessError as e:
-                logger().error(
-                    f"Error running command: {command} failed with exit code {e.returncode} and output '{result.stderr}'"
-                )
-                if fail:
-                    raise
+        try:
+            result = subprocess.run(
+                command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+            )
+            if result.returncode != 0:
+                raise subprocess.CalledProcessError(result.returncode, command)
+        except subprocess.CalledProcessError as e:
+            logger().error(
+                f"Error running command: {command} failed with exit code {e.returncode} and output '{result.stderr}'"
+            )
+            if fail:
+                raise
 
     def convert_to_format(self, *, source: str, target: str):
         cmd = [
-            "ffmpeg",
+            _get_binary("ffmpeg"),
             "-hide_banner",
             "-y",
             "-i",
             source,
+            *_ENCODER_THREADS,
             target,
         ]
         FFmpeg()._run(command=cmd)
 
-    def remove_silence(self, *, filename: str):
-        tmp_filename = ""
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
+    def get_video_codec(self, filename: str) -> str | None:
+        """Returns the codec name of the first video stream, None if it cannot be probed."""
+        cmd = [
+            _get_binary("ffprobe"),
+            "-v",
+            "error",
+            "-select_streams",
+            "v:0",
+            "-show_entries",
+            "stream=codec_name",
+            "-of",
+            "default=noprint_wrappers=1:nokey=1",
+            filename,
+        ]
+        try:
+            result = subprocess.run(
+                cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+            )
+        except OSError as e:
+            logger().error(f"ffmpeg.get_video_codec. Error probing '{filename}': {e}")
+            return None
+        codec = result.stdout.strip()
+        if result.returncode != 0 or not codec:
+            return None
+        return codec
+
+    def remove_audio(self, *, source: str, target: str):
+        cmd = [
+            _get_binary("ffmpeg"),
+            "-hide_banner",
+            "-y",
+            "-i",
+            source,
+            "-map",
+            "0:v:0",
+            "-c:v",
+            "copy",
+            "-an",
+            target,
+        ]
+        FFmpeg()._run(command=cmd)
+
+    """ Replaces the audio of the video without re-encoding the video stream. The audio is
+        padded with silence or cut to match the video duration."""
+
+    def replace_audio(self, *, video_file: str, audio_file: str, target: str):
+        cmd = [
+            _get_binary("ffmpeg"),
+            "-hide_banner",
+            "-y",
+            "-i",
+            video_file,
+            "-i",
+            audio_file,
+            "-map",
+            "0:v:0",
+            "-map",
+            "1:a:0",
+            "-c:v",
+            "copy",
+            "-c:a",
+            "aac",
+            "-b:a",
+            "192k",
+            "-af",
+            "apad",
+            "-shortest",
+            *_ENCODER_THREADS,
+            target,
+        ]
+        FFmpeg()._run(command=cmd)
+
+    """ Applies the audio filter writing to a temporary file in the same directory
+        that then replaces the original file, which is kept if FFmpeg fails."""
+
+    def _filter_audio_in_place(self, *, filename: str, audio_filter: List[str]):
+        extension = os.path.splitext(filename)[1]
+        with tempfile.NamedTemporaryFile(
+            suffix=extension, dir=os.path.dirname(filename) or None, delete=False
+        ) as temp_file:
             tmp_filename = temp_file.name
-            shutil.copyfile(filename, tmp_filename)
-            cmd = [
-                "ffmpeg",
-                "-hide_banner",
-                "-y",
-                "-i",
-                tmp_filename,
+
+        cmd = [
+            _get_binary("ffmpeg"),
+            "-hide_banner",
+            "-y",
+            "-i",
+            filename,
+            *audio_filter,
+            *_ENCODER_THREADS,
+            tmp_filename,
+        ]
+        try:
+            self._run(command=cmd)
+            os.replace(tmp_filename, filename)
+        except subprocess.CalledProcessError:
+            pass  # Already logged by _run
+        finally:
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+
+    def remove_silence(self, *, filename: str):
+        self._filter_audio_in_place(
+            filename=filename,
+            audio_filter=[
                 "-af",
                 "silenceremove=stop_periods=-1:stop_duration=0.1:stop_threshold=-50dB",
-                filename,
-            ]
-            FFmpeg()._run(command=cmd, fail=False)
-
-        if os.path.exists(tmp_filename):
-            os.remove(tmp_filename)
+            ],
+        )
 
     def adjust_audio_speed(self, *, filename: str, speed: float):
-        tmp_filename = ""
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            tmp_filename = temp_file.name
-            shutil.copyfile(filename, tmp_filename)
-            cmd = [
-                "ffmpeg",
-                "-hide_banner",
-                "-y",
-                "-i",
-                tmp_filename,
-                "-filter:a",
-                f"atempo={speed}",
-                filename,
-            ]
-            FFmpeg()._run(command=cmd, fail=False)
-
-        if os.path.exists(tmp_filename):
-            os.remove(tmp_filename)
+        self._filter_audio_in_place(
+            filename=filename, audio_filter=["-filter:a", f"atempo={speed}"]
+        )
+
+    """ Adjusts the speed of several files with a single FFmpeg process, which
+        decodes every input and writes every output using a filter graph."""
+
+    def _adjust_audio_speeds(self, files_speeds: List[Tuple[str, float]]):
+        if len(files_speeds) == 1:
+            filename, speed = files_speeds[0]
+            self.adjust_audio_speed(filename=filename, speed=speed)
+            return
+
+        tmp_filenames = []
+        for filename, _ in files_speeds:
+            with tempfile.NamedTemporaryFile(
+                suffix=os.path.splitext(filename)[1],
+                dir=os.path.dirname(filename) or None,
+                delete=False,
+            ) as temp_file:
+                tmp_filenames.append(temp_file.name)
+
+        cmd = [_get_binary("ffmpeg"), "-hide_banner", "-y"]
+        for filename, _ in files_speeds:
+            cmd.extend(["-i", filename])
+        filters = [
+            f"[{idx}:a]atempo={speed}[a{idx}]"
+            for idx, (_, speed) in enumerate(files_speeds)
+        ]
+        cmd.extend(["-filter_complex", ";".join(filters)])
+        for idx, tmp_filename in enumerate(tmp_filenames):
+            cmd.extend([*_ENCODER_THREADS, "-map", f"[a{idx}]", tmp_filename])
+
+        try:
+            self._run(command=cmd)
+            for tmp_filename, (filename, _) in zip(tmp_filenames, files_speeds):
+                os.replace(tmp_filename, filename)
+        except subprocess.CalledProcessError:
+            # Retry one by one so that a single bad file does not affect the rest
+            for filename, speed in files_speeds:
+                self.adjust_audio_speed(filename=filename, speed=speed)
+        finally:
+            for tmp_filename in tmp_filenames:
+                if os.path.exists(tmp_filename):
+                    os.remove(tmp_filename)
+
+    def batch_adjust_audio_speed(self, files_speeds: List[Tuple[str, float]]):
+        """Adjusts the speed of several files running a few FFmpeg processes in parallel."""
+        if len(files_speeds) == 0:
+            return
+
+        workers = os.cpu_count() or 1
+        group_size = min(_MAX_FILES_PER_PROCESS, math.ceil(len(files_speeds) / workers))
+        groups = [
+            files_speeds[i : i + group_size]
+            for i in range(0, len(files_speeds), group_size)
+        ]
+        logger().debug(
+            f"ffmpeg.batch_adjust_audio_speed: {len(files_speeds)} files in {len(groups)} processes"
+        )
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(self._adjust_audio_speeds, groups))
 
     def embed_subtitles(
         self,
@@ -95,56 +247,62 @@ class FFmpeg:
         subtitles_files: List[str],
         languages_iso_639_3: List[str],
     ):
-        filename = ""
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            shutil.copyfile(video_file, temp_file.name)
-            output_file = video_file  # Modify in-place
-
-            cmd = [
-                "ffmpeg",
-                "-y",  # Overwrite output files without asking
-                "-i",
-                temp_file.name,
-            ]
-
-            # Add subtitle inputs
-            for subtitles_file in subtitles_files:
-                cmd.extend(["-i", subtitles_file])
-
-            # Map streams
-            cmd.append("-map")
-            cmd.append("0")  # Map all streams from the main video file
-            for idx, language in enumerate(languages_iso_639_3):
-                cmd.extend(
-                    [
-                        "-map",
-                        str(idx + 1),  # Map each subtitle file
-                        "-c:s",
-                        "mov_text",  # Subtitle codec
-                        "-metadata:s:s:" + str(idx),
-                        f"language={language}",
-                    ]
-                )
-
-            # Add codecs for video and audio
-            cmd.extend(["-c:v", "copy", "-c:a", "copy", output_file])
-
-            logger().debug(f"embed_subtitles. Command: {' '.join(cmd)}")
-
-            # Run the command using the _run method
-            self._run(command=cmd, fail=False)
-            filename = temp_file.name
-
-        if os.path.exists(filename):
-            os.remove(filename)
+        # The muxed video is written next to the original and then replaces it,
+        # instead of copying the original first to read it from the copy
+        with tempfile.NamedTemporaryFile(
+            suffix=os.path.splitext(video_file)[1],
+            dir=os.path.dirname(video_file) or None,
+            delete=False,
+        ) as temp_file:
+            output_file = temp_file.name
+
+        cmd = [
+            _get_binary("ffmpeg"),
+            "-y",  # Overwrite output files without asking
+            "-i",
+            video_file,
+        ]
+
+        # Add subtitle inputs
+        for subtitles_file in subtitles_files:
+            cmd.extend(["-i", subtitles_file])
+
+        # Map streams
+        cmd.append("-map")
+        cmd.append("0")  # Map all streams from the main video file
+        for idx, language in enumerate(languages_iso_639_3):
+            cmd.extend(
+                [
+                    "-map",
+                    str(idx + 1),  # Map each subtitle file
+                    "-c:s",
+                    "mov_text",  # Subtitle codec
+                    "-metadata:s:s:" + str(idx),
+                    f"language={language}",
+                ]
+            )
+
+        # Add codecs for video and audio
+        cmd.extend(["-c:v", "copy", "-c:a", "copy", output_file])
+
+        logger().debug(f"embed_subtitles. Command: {' '.join(cmd)}")
+
+        try:
+            self._run(command=cmd)
+            os.replace(output_file, video_file)
+        except subprocess.CalledProcessError:
+            pass  # Already logged by _run, the video is kept without subtitles
+        finally:
+            if os.path.exists(output_file):
+                os.remove(output_file)
 
     @staticmethod
     def is_ffmpeg_installed():
-        cmd = ["ffprobe", "-version"]
+        cmd = [_get_binary("ffprobe"), "-version"]
         try:
             if (
                 subprocess.run(
-                    cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+                    cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
                 ).returncode
                 == 0
             ):
@@ -12,34 +12,99 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import atexit
+import functools
+import hashlib
 import logging
+import logging.handlers
 import os
+import queue
 import sys
 import warnings
 
-import transformers
+from concurrent.futures import ThreadPoolExecutor
+from typing import Final
 
 from iso639 import Lang
 
 from open_dubbing import logger
+from open_dubbing.cache import Cache, get_file_hash
 from open_dubbing.command_line import CommandLine
-from open_dubbing.dubbing import Dubber
 from open_dubbing.exit_code import ExitCode
 from open_dubbing.ffmpeg import FFmpeg
-from open_dubbing.speech_to_text_faster_whisper import SpeechToTextFasterWhisper
-from open_dubbing.speech_to_text_openai_whisper import SpeechToTextOpenAIWhisperTransformers
-from open_dubbing.speech_to_text_whisper_transformers import (
-    SpeechToTextWhisperTransformers,
-)
-from open_dubbing.text_to_speech_api import TextToSpeechAPI
-from open_dubbing.text_to_speech_cli import TextToSpeechCLI
-from open_dubbing.text_to_speech_edge import TextToSpeechEdge
-from open_dubbing.text_to_speech_mms import TextToSpeechMMS
-from open_dubbing.translation_apertium import TranslationApertium
-from open_dubbing.translation_nllb import TranslationNLLB
+from open_dubbing.model_registry import ModelRegistry
+from open_dubbing.prefetch import prefetch_directories
+from open_dubbing.utterance import Utterance
+
+# Modules that depend on Hugging Face libraries (transformers, faster-whisper,
+# pyannote) are imported when used, since these libraries read the location of
+# the models cache when they are imported (see _set_model_cache_dir). This also
+# keeps '--help' and argument errors fast since torch is never loaded for them.
+# The engines are imported in the branch that selects them, so only the
+# selected ones are loaded
+
+
+def _set_model_cache_dir(model_cache_dir: str):
+    if not model_cache_dir:
+        return
+
+    model_cache_dir = os.path.abspath(model_cache_dir)
+    os.environ["HF_HOME"] = os.path.join(model_cache_dir, "huggingface")
+    os.environ["XDG_CACHE_HOME"] = model_cache_dir
+
+
+# OpenMP and MKL read these variables when torch, CTranslate2 or ONNX Runtime
+# are loaded, so they have to be set before importing them
+def _set_cpu_threads(cpu_threads: int):
+    if cpu_threads <= 0:
+        return
+
+    os.environ["OMP_NUM_THREADS"] = str(cpu_threads)
+    os.environ["MKL_NUM_THREADS"] = str(cpu_threads)
+
+
+def _check_compute_type(compute_type: str | None, device: str):
+    if not compute_type:
+        return
+
+    import ctranslate2
+
+    try:
+        supported = ctranslate2.get_supported_compute_types(device)
+    except (ValueError, RuntimeError):
+        # e.g. CUDA is not available, the model loading reports it
+        return
+
+    if compute_type not in supported:
+        logger().warning(
+            f"Compute type '{compute_type}' has no optimized kernels on this {device} and will be converted, which is usually slower. Supported compute types: {sorted(supported)}"
+        )
+
+
+def _get_vad_method(vad_method: str | None, vad: bool) -> str:
+    if not vad_method:
+        return "silero" if vad else "off"
+
+    if vad_method == "webrtc":
+        try:
+            import webrtcvad  # noqa: F401
+        except ImportError:
+            msg = "Make sure that WebRTC VAD is installed by running 'pip install open-dubbing[webrtc]'"
+            log_error_and_exit(msg, ExitCode.NO_WEBRTCVAD)
+
+    return vad_method
+
+
+_LOG_FILE_MAX_BYTES: Final[int] = 10_000_000
+_LOG_FILE_BACKUPS: Final[int] = 3
+
+# Writes the log records in a background thread
+_log_listener: logging.handlers.QueueListener | None = None
 
 
 def _init_logging(log_level):
+    global _log_listener
+
     logging.basicConfig(level=logging.ERROR)  # Suppress third-party loggers
 
     # Create your application logger
@@ -47,8 +112,25 @@ def _init_logging(log_level):
     app_logger.setLevel(log_level)
     app_logger.propagate = False
 
-    # File handler for logging to a file
-    file_handler = logging.FileHandler("open_dubbing.log")
+    # Drop handlers from a previous in-process invocation
+    if _log_listener:
+        _log_listener.stop()
+        for handler in _log_listener.handlers:
+            handler.close()
+        atexit.unregister(_log_listener.stop)
+        _log_listener = None
+
+    for handler in list(app_logger.handlers):
+        app_logger.removeHandler(handler)
+        handler.close()
+
+    # File handler for logging to a file, long DEBUG runs do not grow it without limit
+    file_handler = logging.handlers.RotatingFileHandler(
+        "open_dubbing.log",
+        maxBytes=_LOG_FILE_MAX_BYTES,
+        backupCount=_LOG_FILE_BACKUPS,
+        delay=True,
+    )
     console_handler = logging.StreamHandler()
 
     # Formatter for log messages
@@ -56,26 +138,35 @@ def _init_logging(log_level):
     file_handler.setFormatter(formatter)
     console_handler.setFormatter(formatter)
 
-    app_logger.addHandler(file_handler)
-    app_logger.addHandler(console_handler)
+    # Logging only queues the record, the file and console are written by the listener
+    log_queue = queue.SimpleQueue()
+    app_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    _log_listener = logging.handlers.QueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True
+    )
+    _log_listener.start()
+    # Flushes the pending records, also when exiting with log_error_and_exit
+    atexit.register(_log_listener.stop)
 
-    transformers.logging.set_verbosity_error()
+    # Read by transformers when it is imported, importing it here would load torch
+    # also when no transformers based engine is selected
+    os.environ["TRANSFORMERS_VERBOSITY"] = "error"
     warnings.filterwarnings("ignore", category=FutureWarning)
 
 
 def log_error_and_exit(msg: str, code: ExitCode):
     logger().error(msg)
-    exit(code)
+    raise SystemExit(int(code))
 
 
 def check_languages(
     source_language, target_language, _tts, translation, _stt, target_language_region
 ):
-    spt = _stt.get_languages()
-    translation_languages = translation.get_language_pairs()
+    spt = frozenset(_stt.get_languages())
+    translation_languages = frozenset(translation.get_language_pairs())
     logger().debug(f"check_languages. Pairs {len(translation_languages)}")
 
-    tts = _tts.get_languages()
+    tts = frozenset(_tts.get_languages())
 
     if source_language not in spt:
         msg = f"source language '{source_language}' is not supported by the speech recognition system. Supported languages: '{spt}'"
@@ -99,7 +190,8 @@ def check_languages(
         log_error_and_exit(msg, ExitCode.INVALID_LANGUAGE_TTS)
 
 
-_ACCEPTED_VIDEO_FORMATS = ["mp4"]
+# Containers whose video streams can be copied into the dubbed mp4 without re-encoding
+_ACCEPTED_VIDEO_FORMATS: Final[frozenset[str]] = frozenset({"mp4", "m4v", "mov", "mkv"})
 
 
 def check_is_a_video(input_file: str):
@@ -124,15 +216,18 @@ def get_token(provided_token: str) -> str:
     return token
 
 
+@functools.lru_cache(maxsize=None)
+def _get_language_name(language_iso_639_3: str) -> str:
+    return Lang(language_iso_639_3).name
+
+
 def _get_language_names(languages_iso_639_3):
-    names = []
-    for language in languages_iso_639_3:
-        o = Lang(language)
-        names.append(o.name)
-    return sorted(names)
+    return sorted(_get_language_name(language) for language in languages_iso_639_3)
 
 
 def list_supported_languages(_tts, translation, device):  # TODO: Not used
+    from open_dubbing.speech_to_text_faster_whisper import SpeechToTextFasterWhisper
+
     s = SpeechToTextFasterWhisper(device=device)
     s.load_model()
     spt = s.get_languages()
@@ -152,10 +247,15 @@ def _get_selected_tts(
     tts_api_server: str,
     device: str,
     openai_api_key: str,
+    tts_stream: bool = False,
 ):
     if selected_tts == "mms":
+        from open_dubbing.text_to_speech_mms import TextToSpeechMMS
+
         tts = TextToSpeechMMS(device)
     elif selected_tts == "edge":
+        from open_dubbing.text_to_speech_edge import TextToSpeechEdge
+
         tts = TextToSpeechEdge(device)
     elif selected_tts == "coqui":
         try:
@@ -174,8 +274,12 @@ def _get_selected_tts(
             msg = "When using the tts CLI you need to provide a configuration file which describes the commands and voices to use."
             log_error_and_exit(msg, ExitCode.NO_CLI_CFG_FILE)
 
+        from open_dubbing.text_to_speech_cli import TextToSpeechCLI
+
         tts = TextToSpeechCLI(device, tts_cli_cfg_file)
     elif selected_tts == "api":
+        from open_dubbing.text_to_speech_api import TextToSpeechAPI
+
         tts = TextToSpeechAPI(device, tts_api_server)
         if len(tts_api_server) == 0:
             msg = "When using TTS's API, you need to specify with --tts_api_server the URL of the server"
@@ -192,14 +296,35 @@ def _get_selected_tts(
     else:
         raise ValueError(f"Invalid tts value {selected_tts}")
 
+    if tts_stream:
+        tts.enable_streaming(True)
     return tts
 
 
 def _get_selected_translator(
-    translator: str, nllb_model: str, apertium_server: str, device: str
+    translator: str,
+    nllb_model: str,
+    apertium_server: str,
+    device: str,
+    nllb_quantization: str | None = None,
+    cpu_threads: int = 0,
+    batch_size: int = 16,
 ):
     if translator == "nllb":
-        translation = TranslationNLLB(device)
+        if nllb_quantization:
+            # Imports ctranslate2, only needed to run the quantized model
+            from open_dubbing.translation_nllb_ct2 import TranslationNLLBCT2
+
+            translation = TranslationNLLBCT2(
+                device,
+                compute_type=nllb_quantization,
+                cpu_threads=cpu_threads,
+                batch_size=batch_size,
+            )
+        else:
+            from open_dubbing.translation_nllb import TranslationNLLB
+
+            translation = TranslationNLLB(device, batch_size=batch_size)
         translation.load_model(nllb_model)
     elif translator == "apertium":
         server = apertium_server
@@ -207,6 +332,8 @@ def _get_selected_translator(
             msg = "When using Apertium's API, you need to specify with --apertium_server the URL of the server"
             log_error_and_exit(msg, ExitCode.NO_APERTIUM_SERVER)
 
+        from open_dubbing.translation_apertium import TranslationApertium
+
         translation = TranslationApertium(device)
         translation.set_server(server)
     else:
@@ -215,58 +342,31 @@ def _get_selected_translator(
     return translation
 
 
-def _get_openai_key(*, key: str):
-    if key:
-        return key
-
-    VAR = "OPENAI_API_KEY"
-    key = os.getenv(VAR)
-    if key:
-        return key
-
-    msg = f"OpenAI TTS selected but no key has been pass as argument or defined in the environment variable {VAR}"
-    log_error_and_exit(msg, ExitCode.NO_OPENAI_KEY)
-
-
-def main():
-
-    args = CommandLine.read_parameters()
-    _init_logging(args.log_level)
-
-    check_is_a_video(args.input_file)
-
-    hugging_face_token = get_token(args.hugging_face_token)
-
-    if not FFmpeg.is_ffmpeg_installed():
-        msg = "You need to have ffmpeg (which includes ffprobe) installed."
-        log_error_and_exit(msg, ExitCode.NO_FFMPEG)
-
-    tts = _get_selected_tts(
-        args.tts,
-        args.tts_cli_cfg_file,
-        args.tts_api_server,
-        args.device,
-        args.openai_api_key,
-    )
-
-    if sys.platform == "darwin":
-        os.environ["TOKENIZERS_PARALLELISM"] = "false"
-
+def _get_selected_stt(args):
+    vad_method = _get_vad_method(args.vad_method, args.vad)
     stt_type = args.stt
     stt_text = args.stt
     if stt_type == "faster-whisper" or (
         stt_type == "auto" and sys.platform != "darwin"
     ):
+        from open_dubbing.speech_to_text_faster_whisper import SpeechToTextFasterWhisper
+
         stt = SpeechToTextFasterWhisper(
             model_name=args.whisper_model,
             device=args.device,
             cpu_threads=args.cpu_threads,
-            vad=args.vad,
+            vad_method=vad_method,
+            compute_type=args.compute_type,
+            beam_size=args.whisper_beam_size,
         )
-        if args.vad:
-            stt_text += " (with vad filter)"
+        if vad_method != "off":
+            stt_text += f" (with {vad_method} vad filter)"
     elif stt_type == "openai-whisper":
         try:
+            from open_dubbing.speech_to_text_openai_whisper import (
+                SpeechToTextOpenAIWhisperTransformers,
+            )
+
             key = _get_openai_key(key=args.openai_api_key)
             stt = SpeechToTextOpenAIWhisperTransformers(
                 model_name=args.whisper_model,
@@ -278,67 +378,326 @@ def main():
             msg = "Make sure that OpenAI library is installed by running 'pip install open-dubbing[openai]'"
             log_error_and_exit(msg, ExitCode.NO_OPENAI_TTS)
 
-        if args.vad:
+        if vad_method != "off":
+            logger().warning("Vad filter is not supported with OpenAI Whisper API")
+    elif stt_type == "onnx":
+        try:
+            from open_dubbing.speech_to_text_whisper_onnx import SpeechToTextWhisperONNX
+        except Exception:
+            msg = "Make sure that ONNX Runtime is installed by running 'pip install open-dubbing[onnx]'"
+            log_error_and_exit(msg, ExitCode.NO_ONNX_RUNTIME)
+
+        stt = SpeechToTextWhisperONNX(
+            model_name=args.whisper_model,
+            device=args.device,
+            cpu_threads=args.cpu_threads,
+            beam_size=args.whisper_beam_size,
+        )
+        if vad_method != "off":
             logger().warning(
-                "Vad filter is not supported with OpenAI Whisper API"
+                "Vad filter is only supported in fasterwhisper Speech to Text library"
             )
     else:
+        from open_dubbing.speech_to_text_whisper_transformers import (
+            SpeechToTextWhisperTransformers,
+        )
+
         stt = SpeechToTextWhisperTransformers(
             model_name=args.whisper_model,
             device=args.device,
             cpu_threads=args.cpu_threads,
+            beam_size=args.whisper_beam_size,
         )
-        if args.vad:
+        if vad_method != "off":
             logger().warning(
                 "Vad filter is only supported in fasterwhisper Speech to Text library"
             )
+        if args.compute_type:
+            logger().warning(
+                "Compute type is only supported in fasterwhisper Speech to Text library"
+            )
+
+    return stt, stt_text
+
 
+def _load_selected_stt(args):
+    stt, stt_text = _get_selected_stt(args)
     stt.load_model()
+    return stt, stt_text
+
+
+def _get_source_language_from_metadata(target_language: str, output_directory: str):
+    try:
+        _, _, metadata = Utterance(target_language, output_directory).load_utterances()
+        return metadata["source_language"]
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        msg = f"Cannot read the source language from the metadata of a previous execution at '{output_directory}', specify it with --source_language. Error: '{e}'"
+        log_error_and_exit(msg, ExitCode.UPDATE_MISSING_FILES)
+
+
+def _get_openai_key(*, key: str):
+    if key:
+        return key
+
+    VAR = "OPENAI_API_KEY"
+    key = os.getenv(VAR)
+    if key:
+        return key
+
+    msg = f"OpenAI TTS selected but no key has been pass as argument or defined in the environment variable {VAR}"
+    log_error_and_exit(msg, ExitCode.NO_OPENAI_KEY)
+
+
+def _resolve_device(device: str) -> str:
+    """Resolves 'auto' once, so the models get a concrete device and do not probe it again."""
+    if device != "auto":
+        return device
+
+    import torch
+
+    resolved = "cuda" if torch.cuda.is_available() else "cpu"
+    logger().info(f"Using device '{resolved}'")
+    return resolved
+
+
+# Options that do not change the results of the stages that are resumed. The input
+# file is identified by its content, the file is renamed when it has spaces
+_NOT_RESUME_OPTIONS: Final[frozenset[str]] = frozenset(
+    {
+        "input_file",
+        "log_level",
+        "resume",
+        "update",
+        "hugging_face_token",
+        "openai_api_key",
+    }
+)
+
+
+def _get_resume_dir(args) -> str:
+    """Returns the directory where the runs with the same input file and options save their stages."""
+    options = sorted(
+        (name, value)
+        for name, value in vars(args).items()
+        if name not in _NOT_RESUME_OPTIONS
+    )
+    run_id = hashlib.blake2b(
+        f"{get_file_hash(args.input_file)}{options}".encode(), digest_size=8
+    ).hexdigest()
+    return os.path.join(args.output_directory, ".stages", run_id)
+
+
+def _get_downloaded_model_directories(args) -> list[str]:
+    """Returns the directories of the speech to text and translation models that are already downloaded."""
+    directories = []
+    if args.stt == "faster-whisper" or (
+        args.stt == "auto" and sys.platform != "darwin"
+    ):
+        try:
+            from faster_whisper.utils import download_model
+
+            directories.append(
+                download_model(args.whisper_model, local_files_only=True)
+            )
+        except Exception:
+            pass  # Downloaded when the model is loaded
+
+    if args.translator == "nllb":
+        if args.nllb_quantization:
+            from open_dubbing.translation_nllb_ct2 import TranslationNLLBCT2
+
+            directory = TranslationNLLBCT2.get_converted_model_dir(
+                args.nllb_model, args.nllb_quantization
+            )
+            if os.path.isdir(directory):
+                directories.append(directory)
+        else:
+            try:
+                from huggingface_hub import snapshot_download
+
+                directories.append(
+                    snapshot_download(
+                        f"facebook/{args.nllb_model}", local_files_only=True
+                    )
+                )
+            except Exception:
+                pass  # Downloaded when the model is loaded
+
+    return directories
+
+
+def _prefetch_models(args) -> None:
+    prefetch_directories(_get_downloaded_model_directories(args))
+
+
+def _load_stt_and_translation(executor: ThreadPoolExecutor, args, cache: Cache):
+    """Loads the speech to text and translation models at the same time.
+
+    The source language is detected while the translation model is loading,
+    unless it was already detected for the same file in a previous run.
+    """
+    # The weights start to be read from disk while the libraries are imported
+    executor.submit(_prefetch_models, args)
+    stt_future = executor.submit(
+        ModelRegistry.get,
+        "stt",
+        (
+            args.stt,
+            args.whisper_model,
+            args.device,
+            args.cpu_threads,
+            args.compute_type,
+            args.whisper_beam_size,
+            args.vad,
+            args.vad_method,
+        ),
+        lambda: _load_selected_stt(args),
+    )
+    translation_future = executor.submit(
+        ModelRegistry.get,
+        "translation",
+        (
+            args.translator,
+            args.nllb_model,
+            args.apertium_server,
+            args.device,
+            args.nllb_quantization,
+            args.cpu_threads,
+            args.translation_batch_size,
+        ),
+        lambda: _get_selected_translator(
+            args.translator,
+            args.nllb_model,
+            args.apertium_server,
+            args.device,
+            nllb_quantization=args.nllb_quantization,
+            cpu_threads=args.cpu_threads,
+            batch_size=args.translation_batch_size,
+        ),
+    )
+
+    stt, stt_text = stt_future.result()
     source_language = args.source_language
     if not source_language:
-        source_language = stt.detect_language(args.input_file)
+        key = (
+            f"language:{stt_text}:{args.whisper_model}:{get_file_hash(args.input_file)}"
+        )
+        source_language = cache.get_or_compute(
+            key, lambda: stt.detect_language(args.input_file)
+        )
         logger().info(f"Detected language '{source_language}'")
 
-    translation = _get_selected_translator(
-        args.translator, args.nllb_model, args.apertium_server, args.device
-    )
+    return stt, stt_text, translation_future.result(), source_language
+
+
+def main(argv=None):
+
+    args = CommandLine.read_parameters(argv)
+    _set_model_cache_dir(args.model_cache_dir)
+    _set_cpu_threads(args.cpu_threads)
+    # Read by tokenizers when it is loaded, as the thread variables
+    if sys.platform == "darwin":
+        os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    _init_logging(args.log_level)
+    args.device = _resolve_device(args.device)
 
-    check_languages(
-        source_language,
-        args.target_language,
-        tts,
-        translation,
-        stt,
-        args.target_language_region,
+    check_is_a_video(args.input_file)
+
+    hugging_face_token = get_token(args.hugging_face_token)
+    # Checked before loading any model, a missing key fails the run right away
+    if args.tts == "openai" or args.stt == "openai-whisper":
+        args.openai_api_key = _get_openai_key(key=args.openai_api_key)
+
+    if not FFmpeg.is_ffmpeg_installed():
+        msg = "You need to have ffmpeg (which includes ffprobe) installed."
+        log_error_and_exit(msg, ExitCode.NO_FFMPEG)
+
+    tts_params = (
+        args.tts,
+        args.tts_cli_cfg_file,
+        args.tts_api_server,
+        args.device_map.get("tts", args.device),
+        args.openai_api_key,
+        args.tts_stream,
     )
 
     if not os.path.exists(args.output_directory):
         os.makedirs(args.output_directory)
 
-    dubber = Dubber(
-        input_file=args.input_file,
-        output_directory=args.output_directory,
-        source_language=source_language,
-        target_language=args.target_language,
-        target_language_region=args.target_language_region,
-        hugging_face_token=hugging_face_token,
-        tts=tts,
-        translation=translation,
-        stt=stt,
-        device=args.device,
-        cpu_threads=args.cpu_threads,
-        clean_intermediate_files=args.clean_intermediate_files,
-        original_subtitles=args.original_subtitles,
-        dubbed_subtitles=args.dubbed_subtitles,
-    )
+    with Cache(args.output_directory) as cache:
+        # The models are independent, so they are loaded at the same time
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            tts_future = executor.submit(
+                ModelRegistry.get,
+                "tts",
+                tts_params,
+                lambda: _get_selected_tts(*tts_params),
+            )
+            if args.update:
+                # Update only converts to speech the utterances modified in the metadata,
+                # speech to text and translation models are not needed
+                stt, translation = None, None
+                stt_text = "none"
+                source_language = args.source_language
+                if not source_language:
+                    source_language = _get_source_language_from_metadata(
+                        args.target_language, args.output_directory
+                    )
+            else:
+                _check_compute_type(args.compute_type, args.device)
+                _check_compute_type(args.nllb_quantization, args.device)
+                stt, stt_text, translation, source_language = _load_stt_and_translation(
+                    executor, args, cache
+                )
+            tts = tts_future.result()
+
+        if not args.update:
+            check_languages(
+                source_language,
+                args.target_language,
+                tts,
+                translation,
+                stt,
+                args.target_language_region,
+            )
 
-    logger().info(
-        f"Processing '{args.input_file}' file with stt '{stt_text}', tts '{args.tts}' and device '{args.device}'"
-    )
-    if args.update:
-        dubber.update()
-    else:
-        dubber.dub()
+        from open_dubbing.dubbing import Dubber
+
+        dubber = Dubber(
+            input_file=args.input_file,
+            output_directory=args.output_directory,
+            source_language=source_language,
+            target_language=args.target_language,
+            target_language_region=args.target_language_region,
+            hugging_face_token=hugging_face_token,
+            tts=tts,
+            translation=translation,
+            stt=stt,
+            device=args.device,
+            device_map=args.device_map,
+            cpu_threads=args.cpu_threads,
+            clean_intermediate_files=args.clean_intermediate_files,
+            original_subtitles=args.original_subtitles,
+            dubbed_subtitles=args.dubbed_subtitles,
+            tts_concurrency=args.tts_concurrency,
+            video_codec=args.video_codec,
+            diarization=args.diarization,
+            quantize_diarization=args.quantize_diarization,
+            sequential_preprocessing=args.sequential_preprocessing,
+            stt_batch_size=args.stt_batch_size,
+            cache=cache,
+            resume_dir=(
+                _get_resume_dir(args) if args.resume and not args.update else None
+            ),
+        )
+
+        logger().info(
+            f"Processing '{args.input_file}' file with stt '{stt_text}', tts '{args.tts}' and device '{args.device}'"
+        )
+        if args.update:
+            dubber.update()
+        else:
+            dubber.dub()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,45 @@
+# Copyright 2024 Jordi Mas i Hernàndez <jmas@softcatala.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import contextlib
+
+import torch
+
+
+def get_half_precision_dtype(device: str) -> torch.dtype | None:
+    """Returns the 16-bit type that runs on the tensor cores of the device, None for CPU."""
+    if not device.startswith("cuda"):
+        return None
+
+    # bfloat16 keeps the float32 range but needs Ampere (compute capability 8.0) or newer
+    if torch.cuda.get_device_capability(torch.device(device)) >= (8, 0):
+        return torch.bfloat16
+    return torch.float16
+
+
+def autocast(device: str, dtype: torch.dtype | None = None):
+    """Runs the forward passes in half precision on CUDA devices.
+
+    By default with the type returned by get_half_precision_dtype.
+    """
+    half_precision_dtype = get_half_precision_dtype(device)
+    if half_precision_dtype is None:
+        return contextlib.nullcontext()
+    return torch.autocast(device_type="cuda", dtype=dtype or half_precision_dtype)
+
+
+def enable_tf32() -> None:
+    """Lets the float32 matrix multiplications and convolutions use TF32 on Ampere or newer GPUs."""
+    torch.set_float32_matmul_precision("high")
+    torch.backends.cudnn.allow_tf32 = True
@@ -0,0 +1,60 @@
+# Copyright 2024 Jordi Mas i Hernàndez <jmas@softcatala.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+
+from typing import Any, Callable, Hashable
+
+from open_dubbing import logger
+
+
+class ModelRegistry:
+    """Keeps the loaded models for the lifetime of the process.
+
+    When several videos are dubbed in the same process (e.g. a server or the
+    tests) the models are loaded only the first time and reused afterwards.
+    """
+
+    _models: dict = {}
+    _lock = threading.Lock()
+    # Different models load at the same time, the same model only once
+    _key_locks: dict = {}
+
+    @staticmethod
+    def get(name: str, params: Hashable, loader: Callable[[], Any]) -> Any:
+        """Returns the model loaded with params, calling loader only the first time.
+
+        A loader that returns None (e.g. no access to a gated model yet) is
+        called again the next time.
+        """
+        key = (name, params)
+        with ModelRegistry._lock:
+            key_lock = ModelRegistry._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            if key in ModelRegistry._models:
+                logger().debug(f"Reusing loaded model '{name}'")
+                return ModelRegistry._models[key]
+
+            model = loader()
+            if model is not None:
+                ModelRegistry._models[key] = model
+            return model
+
+    @staticmethod
+    def clear() -> None:
+        """Releases all the loaded models."""
+        with ModelRegistry._lock:
+            ModelRegistry._models.clear()
+            ModelRegistry._key_locks.clear()
@@ -0,0 +1,46 @@
+# Copyright 2024 Jordi Mas i Hernàndez <jmas@softcatala.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+
+from typing import Final, Iterable
+
+from open_dubbing import logger
+
+# Only available on Linux and some other Unix systems
+_HAS_FADVISE: Final[bool] = hasattr(os, "posix_fadvise")
+
+
+def prefetch_directories(directories: Iterable[str]) -> None:
+    """Asks the kernel to start reading the files into the page cache.
+
+    The call returns without waiting for the reads, so the model weights are
+    read from disk while the libraries that load them are still being imported.
+    """
+    if not _HAS_FADVISE:
+        return
+
+    for directory in directories:
+        for root, _, files in os.walk(directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    fd = os.open(path, os.O_RDONLY)
+                    try:
+                        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+                    finally:
+                        os.close(fd)
+                except OSError as e:
+                    logger().debug(f"prefetch.prefetch_directories. '{path}': {e}")
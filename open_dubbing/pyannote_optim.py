@@ -0,0 +1,35 @@
+# Copyright 2024 Jordi Mas i Hernàndez <jmas@softcatala.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import torch
+
+from pyannote.audio import Pipeline
+
+# Layers with int8 kernels for CPU inference that can be quantized without calibration data
+_QUANTIZABLE_LAYERS = {torch.nn.Linear, torch.nn.LSTM}
+
+
+def quantize_model(model: torch.nn.Module) -> torch.nn.Module:
+    """Quantizes in place the weights of the linear and LSTM layers to int8."""
+    return torch.quantization.quantize_dynamic(
+        model, _QUANTIZABLE_LAYERS, dtype=torch.qint8, inplace=True
+    )
+
+
+def quantize_embedding_model(pipeline: Pipeline) -> None:
+    """Quantizes the speaker embedding model of the pipeline to run faster on CPU.
+
+    The segmentation model is not changed, its LSTM decides the speaker turns.
+    """
+    quantize_model(pipeline._embedding.model_)
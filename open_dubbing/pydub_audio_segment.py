@@ -21,21 +21,26 @@
 from __future__ import division
 
 import array
+import functools
 import json
 import os
 import re
 import struct
 import subprocess
 import sys
+import threading
 import wave
 
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from math import log
 from subprocess import PIPE, Popen
 from tempfile import NamedTemporaryFile, TemporaryFile
 from warnings import warn
 
+import numpy as np
+
 try:
     import audioop
 except ImportError:
@@ -110,6 +115,8 @@ def ratio_to_db(ratio, val2=None, using_amplitude=True):
         return 10 * log(ratio, 10)
 
 
+# The programs installed do not change while the process runs
+@functools.lru_cache(maxsize=None)
 def which(program):
     """
     Mimics behavior of UNIX which command.
@@ -126,6 +133,7 @@ def which(program):
             return program_path
 
 
+@functools.lru_cache(maxsize=None)
 def get_encoder_name():
     """
     Return enconder default application for system, either avconv or ffmpeg
@@ -143,6 +151,8 @@ def get_encoder_name():
         return "ffmpeg"
 
 
+# Called for every file probed, the warning is only shown the first time
+@functools.lru_cache(maxsize=None)
 def get_prober_name():
     """
     Return probe application, either avconv or ffmpeg
@@ -178,6 +188,17 @@ def fsdecode(filename):
     raise TypeError("type {0} not accepted by fsdecode".format(type(filename)))
 
 
+# Compiled once, they are matched for every probed file
+_RE_STREAM = re.compile(
+    r"(?P<space_start> +)Stream #0[:\.](?P<stream_id>([0-9]+))(?P<content_0>.+)\n?(?! *Stream)((?P<space_end> +)(?P<content_1>.+))?"
+)
+_RE_TOKEN_SEPARATOR = re.compile(r"[:,]")
+_RE_INT_SAMPLE_FMT_BITS = re.compile(r"([su]([0-9]{1,2})p?) \(([0-9]{1,2}) bit\)$")
+_RE_INT_SAMPLE_FMT = re.compile(r"([su]([0-9]{1,2})p?)( \(default\))?$")
+_RE_FLOAT_SAMPLE_FMT = re.compile(r"(flt)p?( \(default\))?$")
+_RE_DOUBLE_SAMPLE_FMT = re.compile(r"(dbl)p?( \(default\))?$")
+
+
 def get_extra_info(stderr):
     """
     avprobe sometimes gives more information on stderr than
@@ -193,19 +214,36 @@ def get_extra_info(stderr):
     """
     extra_info = {}
 
-    re_stream = r"(?P<space_start> +)Stream #0[:\.](?P<stream_id>([0-9]+))(?P<content_0>.+)\n?(?! *Stream)((?P<space_end> +)(?P<content_1>.+))?"
-    for i in re.finditer(re_stream, stderr):
+    for i in _RE_STREAM.finditer(stderr):
         if i.group("space_end") is not None and len(i.group("space_start")) <= len(
             i.group("space_end")
         ):
             content_line = ",".join([i.group("content_0"), i.group("content_1")])
         else:
             content_line = i.group("content_0")
-        tokens = [x.strip() for x in re.split("[:,]", content_line) if x]
+        tokens = [x.strip() for x in _RE_TOKEN_SEPARATOR.split(content_line) if x]
         extra_info[int(i.group("stream_id"))] = tokens
     return extra_info
 
 
+def _read_ahead(filename):
+    """
+    Asks the kernel to start reading the whole file into the page cache
+    without waiting for it, e.g. while ffprobe reads the headers
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+
+    try:
+        fd = os.open(filename, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+
 def mediainfo_json(filepath, read_ahead_limit=-1):
     """Return json dictionary with media info(codec, duration, size, bitrate...) from filepath"""
     prober = get_prober_name()
@@ -258,8 +296,8 @@ def mediainfo_json(filepath, read_ahead_limit=-1):
             stream[prop] = value
 
     for token in extra_info[stream["index"]]:
-        m = re.match(r"([su]([0-9]{1,2})p?) \(([0-9]{1,2}) bit\)$", token)
-        m2 = re.match(r"([su]([0-9]{1,2})p?)( \(default\))?$", token)
+        m = _RE_INT_SAMPLE_FMT_BITS.match(token)
+        m2 = _RE_INT_SAMPLE_FMT.match(token)
         if m:
             set_property(stream, "sample_fmt", m.group(1))
             set_property(stream, "bits_per_sample", int(m.group(2)))
@@ -268,17 +306,35 @@ def mediainfo_json(filepath, read_ahead_limit=-1):
             set_property(stream, "sample_fmt", m2.group(1))
             set_property(stream, "bits_per_sample", int(m2.group(2)))
             set_property(stream, "bits_per_raw_sample", int(m2.group(2)))
-        elif re.match(r"(flt)p?( \(default\))?$", token):
+        elif _RE_FLOAT_SAMPLE_FMT.match(token):
             set_property(stream, "sample_fmt", token)
             set_property(stream, "bits_per_sample", 32)
             set_property(stream, "bits_per_raw_sample", 32)
-        elif re.match(r"(dbl)p?( \(default\))?$", token):
+        elif _RE_DOUBLE_SAMPLE_FMT.match(token):
             set_property(stream, "sample_fmt", token)
             set_property(stream, "bits_per_sample", 64)
             set_property(stream, "bits_per_raw_sample", 64)
     return info
 
 
+def mediainfo_json_many(filepaths, read_ahead_limit=-1, max_workers=None):
+    """Return the mediainfo_json of each file, probing several files at the same time.
+
+    ffprobe reads a single input per process, so the processes of the files
+    run in parallel instead of one after the other. The results can be passed
+    to AudioSegment.from_file(..., info=...) to skip probing the file again.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        return list(
+            executor.map(
+                lambda filepath: mediainfo_json(
+                    filepath, read_ahead_limit=read_ahead_limit
+                ),
+                filepaths,
+            )
+        )
+
+
 class PydubException(Exception):
     """
     Base class for any Pydub exception
@@ -356,13 +412,18 @@ WavData = namedtuple(
 )
 
 
+# Compiled once, the WAV headers are parsed for every decoded file
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+
+
 def extract_wav_headers(data):
     # def search_subchunk(data, subchunk_id):
     pos = 12  # The size of the RIFF chunk descriptor
     subchunks = []
     while pos + 8 <= len(data) and len(subchunks) < 10:
         subchunk_id = data[pos : pos + 4]
-        subchunk_size = struct.unpack_from("<I", data[pos + 4 : pos + 8])[0]
+        subchunk_size = _U32.unpack_from(data, pos + 4)[0]
         subchunks.append(WavSubChunk(subchunk_id, pos, subchunk_size))
         if subchunk_id == b"data":
             # 'data' is the last subchunk
@@ -381,13 +442,13 @@ def read_wav_audio(data, headers=None):
         raise CouldntDecodeError("Couldn't find fmt header in wav data")
     fmt = fmt[0]
     pos = fmt.position + 8
-    audio_format = struct.unpack_from("<H", data[pos : pos + 2])[0]
+    audio_format = _U16.unpack_from(data, pos)[0]
     if audio_format != 1 and audio_format != 0xFFFE:
         raise CouldntDecodeError("Unknown audio format 0x%X in wav data" % audio_format)
 
-    channels = struct.unpack_from("<H", data[pos + 2 : pos + 4])[0]
-    sample_rate = struct.unpack_from("<I", data[pos + 4 : pos + 8])[0]
-    bits_per_sample = struct.unpack_from("<H", data[pos + 14 : pos + 16])[0]
+    channels = _U16.unpack_from(data, pos + 2)[0]
+    sample_rate = _U32.unpack_from(data, pos + 4)[0]
+    bits_per_sample = _U16.unpack_from(data, pos + 14)[0]
 
     data_hdr = headers[-1]
     if data_hdr.id != b"data":
@@ -399,10 +460,82 @@ def read_wav_audio(data, headers=None):
         channels,
         sample_rate,
         bits_per_sample,
-        data[pos : pos + data_hdr.size],
+        bytes(memoryview(data)[pos : pos + data_hdr.size]),
     )
 
 
+# Enough to contain the fmt subchunk of a wav or the STREAMINFO block of a flac
+_LOSSLESS_HEADER_SIZE = 64 * 1024
+
+
+def lossless_bits_per_sample(filename, format):
+    """Returns the bits per sample that ffprobe would report for a wav or flac file.
+
+    It is read from the file header, None when the file is not a wav or flac
+    or the header cannot be parsed.
+    """
+    try:
+        with open(filename, "rb") as f:
+            header = f.read(_LOSSLESS_HEADER_SIZE)
+    except (OSError, TypeError, ValueError):
+        return None
+
+    if format == "wav" and header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        fmt = [x for x in extract_wav_headers(header) if x.id == b"fmt "]
+        if not fmt or fmt[0].size < 16 or fmt[0].position + 24 > len(header):
+            return None
+        return _U16.unpack_from(header, fmt[0].position + 22)[0] or None
+
+    # STREAMINFO is always the first metadata block
+    if format == "flac" and header[:4] == b"fLaC" and len(header) >= 22:
+        if header[4] & 0x7F != 0:
+            return None
+        # 20 bits sample rate, 3 bits channels, 5 bits (bits per sample - 1)
+        bits = ((struct.unpack_from(">I", header, 18)[0] >> 4) & 0x1F) + 1
+        # ffmpeg decodes flac as s16 or s32 samples
+        return 16 if bits <= 16 else 32
+
+    return None
+
+
+# Size of the reads of the decoded audio from ffmpeg
+_READ_CHUNK_SIZE = 1024 * 1024
+# Size of the reads of file-like objects that cannot be read at once
+_FILE_READ_CHUNK_SIZE = 16 * 1024 * 1024
+
+
+def _read_process_output(process, stdin_data):
+    """Returns the stdout of the process in a bytearray and its stderr.
+
+    Unlike communicate(), the output is read into a single mutable buffer, so
+    the WAV headers can be fixed in place without copying the audio again.
+    """
+    stderr = []
+
+    def _write_stdin():
+        try:
+            process.stdin.write(stdin_data)
+        except BrokenPipeError:
+            pass  # ffmpeg exited, the error is in its stderr
+        finally:
+            process.stdin.close()
+
+    threads = [threading.Thread(target=lambda: stderr.append(process.stderr.read()))]
+    if stdin_data is not None:
+        threads.append(threading.Thread(target=_write_stdin))
+    for thread in threads:
+        thread.start()
+
+    output = bytearray()
+    while chunk := process.stdout.read(_READ_CHUNK_SIZE):
+        output += chunk
+
+    for thread in threads:
+        thread.join()
+    process.wait()
+    return output, stderr[0]
+
+
 def fix_wav_headers(data):
     headers = extract_wav_headers(data)
     if not headers or headers[-1].id != b"data":
@@ -413,11 +546,11 @@ def fix_wav_headers(data):
         raise CouldntDecodeError("Unable to process >4GB files")
 
     # Set the file size in the RIFF chunk descriptor
-    data[4:8] = struct.pack("<I", len(data) - 8)
+    _U32.pack_into(data, 4, len(data) - 8)
 
     # Set the data size in the data subchunk
     pos = headers[-1].position
-    data[pos + 4 : pos + 8] = struct.pack("<I", len(data) - pos - 8)
+    _U32.pack_into(data, pos + 4, len(data) - pos - 8)
 
 
 class AudioSegment(object):
@@ -484,14 +617,18 @@ class AudioSegment(object):
         else:
             # normal construction
             try:
-                data = data if isinstance(data, (str, bytes)) else data.read()
+                data = (
+                    data if isinstance(data, (str, bytes, bytearray)) else data.read()
+                )
             except OSError:
-                d = b""
-                reader = data.read(2**31 - 1)
-                while reader:
-                    d += reader
-                    reader = data.read(2**31 - 1)
-                data = d
+                # bytearray is accepted like bytes, no need for a final copy
+                buf = bytearray()
+                while True:
+                    chunk = data.read(_FILE_READ_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    buf.extend(chunk)
+                data = buf
 
             wav_data = read_wav_audio(data)
             if not wav_data:
@@ -509,28 +646,50 @@ class AudioSegment(object):
         # Convert 24-bit audio to 32-bit audio.
         # (stdlib audioop and array modules do not support 24-bit data)
         if self.sample_width == 3:
-            byte_buffer = BytesIO()
-
-            # Workaround for python 2 vs python 3. _data in 2.x are length-1 strings,
-            # And in 3.x are ints.
-            pack_fmt = "BBB" if isinstance(self._data[0], int) else "ccc"
-
             # This conversion maintains the 24 bit values.  The values are
             # not scaled up to the 32 bit range.  Other conversions could be
             # implemented.
-            i = iter(self._data)
-            padding = {False: b"\x00", True: b"\xFF"}
-            for b0, b1, b2 in zip(i, i, i):
-                byte_buffer.write(padding[b2 > b"\x7f"[0]])
-                old_bytes = struct.pack(pack_fmt, b0, b1, b2)
-                byte_buffer.write(old_bytes)
-
-            self._data = byte_buffer.getvalue()
+            samples = np.frombuffer(self._data, dtype=np.uint8).reshape(-1, 3)
+            converted = np.zeros((samples.shape[0], 4), dtype=np.uint8)
+            converted[:, 1:4] = samples
+            # Each sample shifted 8 bits left, the low byte is filled with
+            # the sign without branching: the arithmetic shift gives 0 or -1
+            values = converted.view("<i4").reshape(-1)
+            values |= (values >> 31) & 0xFF
+            self._data = values.tobytes()
             self.sample_width = 4
             self.frame_width = self.channels * self.sample_width
 
+        # Used to convert every position in milliseconds to frames
+        self._frames_per_ms = self.frame_rate / 1000.0
+
         super(AudioSegment, self).__init__(*args, **kwargs)
 
+    @property
+    def _data(self):
+        return self._data_bytes()
+
+    @_data.setter
+    def _data(self, data):
+        # A memoryview when the segment is a slice of another one
+        self._buffer = data
+
+    def _data_bytes(self):
+        """
+        returns the audio data as bytes. Slices keep a view of the data of
+        the segment they come from, it is only copied the first time it is
+        needed (audioop, numpy, export...)
+        """
+        if isinstance(self._buffer, memoryview):
+            self._buffer = self._buffer.tobytes()
+        return self._buffer
+
+    def __getstate__(self):
+        # memoryview objects cannot be pickled or copied
+        state = self.__dict__.copy()
+        state["_buffer"] = self._data_bytes()
+        return state
+
     @property
     def raw_data(self):
         """
@@ -571,7 +730,18 @@ class AudioSegment(object):
         return not (self == other)
 
     def __iter__(self):
-        return (self[i] for i in range(len(self)))
+        return self.iter_ms()
+
+    def iter_ms(self, step=1):
+        """
+        yields consecutive segments of step milliseconds, like self[::step]
+        but the length and the frames per millisecond are computed only once
+        """
+        length = len(self)
+        for i in range(0, length, step):
+            start = int(i * self._frames_per_ms) * self.frame_width
+            end = int(min(i + step, length) * self._frames_per_ms) * self.frame_width
+            yield self._spawn_frames(start, end)
 
     def __getitem__(self, millisecond):
         if isinstance(millisecond, slice):
@@ -584,15 +754,23 @@ class AudioSegment(object):
             start = millisecond.start if millisecond.start is not None else 0
             end = millisecond.stop if millisecond.stop is not None else len(self)
 
-            start = min(start, len(self))
-            end = min(end, len(self))
+            length = len(self)
+            start = min(start, length)
+            end = min(end, length)
         else:
             start = millisecond
             end = millisecond + 1
 
         start = self._parse_position(start) * self.frame_width
         end = self._parse_position(end) * self.frame_width
-        data = self._data[start:end]
+        return self._spawn_frames(start, end)
+
+    def _spawn_frames(self, start, end):
+        """
+        returns the segment between the start and end byte offsets, filling
+        with silence the frames past the end of the data
+        """
+        data = memoryview(self._buffer)[start:end]
 
         # ensure the output is as long as the requester is expecting
         expected_length = end - start
@@ -604,8 +782,10 @@ class AudioSegment(object):
                     "   more than 2 ms with silence here, "
                     "missing frames: %s" % missing_frames
                 )
-            silence = audioop.mul(data[: self.frame_width], self.sample_width, 0)
-            data += silence * missing_frames
+            # Silent frames are all zero bytes, allocated zeroed in one go.
+            # As before, nothing is filled in when there is no data at all
+            if data:
+                data = b"".join((data, bytes(self.frame_width * missing_frames)))
 
         return self._spawn(data)
 
@@ -671,12 +851,9 @@ class AudioSegment(object):
     def _parse_position(self, val):
         if val < 0:
             val = len(self) - abs(val)
-        val = (
-            self.frame_count(ms=len(self))
-            if val == float("inf")
-            else self.frame_count(ms=val)
-        )
-        return int(val)
+        if val == float("inf"):
+            val = len(self)
+        return int(val * self._frames_per_ms)
 
     @classmethod
     def silent(cls, duration=1000, frame_rate=11025):
@@ -713,15 +890,15 @@ class AudioSegment(object):
         frame_rate = segs[0].frame_rate
 
         frame_count = max(int(seg.frame_count()) for seg in segs)
-        data = array.array(
-            segs[0].array_type, b"\0" * (frame_count * sample_width * channels)
-        )
-
+        dtype = np.dtype(segs[0].array_type)
+        samples = np.zeros((channels, frame_count), dtype=dtype)
         for i, seg in enumerate(segs):
-            data[i::channels] = seg.get_array_of_samples()
+            seg_samples = np.frombuffer(seg._data, dtype=dtype)
+            samples[i, : seg_samples.size] = seg_samples
 
+        # Transposed, the samples of each frame are next to each other
         return cls(
-            data,
+            samples.T.tobytes(),
             channels=channels,
             sample_width=sample_width,
             frame_rate=frame_rate,
@@ -736,7 +913,7 @@ class AudioSegment(object):
         parameters=None,
         start_second=None,
         duration=None,
-        **kwargs
+        **kwargs,
     ):
         orig_file = file
         try:
@@ -826,10 +1003,25 @@ class AudioSegment(object):
             stdin_parameter = subprocess.PIPE
             stdin_data = file.read()
 
+        bits_per_sample = None
         if codec:
             info = None
+        elif "info" in kwargs:
+            # Probed beforehand, e.g. with mediainfo_json_many
+            info = kwargs["info"]
         else:
-            info = mediainfo_json(orig_file, read_ahead_limit=read_ahead_limit)
+            # For wav and flac files the header has all we need, no ffprobe call
+            lossless_format = next((f for f in ("wav", "flac") if is_format(f)), None)
+            if filename and lossless_format:
+                bits_per_sample = lossless_bits_per_sample(filename, lossless_format)
+            if bits_per_sample:
+                info = None
+            else:
+                # The decoding depends on the probe, but reading the file
+                # from disk for ffmpeg can overlap with it
+                if filename:
+                    _read_ahead(filename)
+                info = mediainfo_json(orig_file, read_ahead_limit=read_ahead_limit)
         if info:
             audio_streams = [x for x in info["streams"] if x["codec_type"] == "audio"]
             # This is a workaround for some ffprobe versions that always say
@@ -845,6 +1037,7 @@ class AudioSegment(object):
                 bits_per_sample = 16
             else:
                 bits_per_sample = audio_streams[0]["bits_per_sample"]
+        if info or bits_per_sample:
             if bits_per_sample == 8:
                 acodec = "pcm_u8"
             else:
@@ -878,7 +1071,7 @@ class AudioSegment(object):
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
         )
-        p_out, p_err = p.communicate(input=stdin_data)
+        p_out, p_err = _read_process_output(p, stdin_data)
 
         if p.returncode != 0 or len(p_out) == 0:
             if close_file:
@@ -889,9 +1082,7 @@ class AudioSegment(object):
                 )
             )
 
-        p_out = bytearray(p_out)
         fix_wav_headers(p_out)
-        p_out = bytes(p_out)
         obj = cls(p_out)
 
         if close_file:
@@ -1108,7 +1299,7 @@ class AudioSegment(object):
         if ms is not None:
             return ms * (self.frame_rate / 1000.0)
         else:
-            return float(len(self._data) // self.frame_width)
+            return float(len(self._buffer) // self.frame_width)
 
     def set_sample_width(self, sample_width):
         if sample_width == self.sample_width:
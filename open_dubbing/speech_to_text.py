@@ -17,13 +17,15 @@ import os
 import re
 
 from abc import ABC, abstractmethod
-from typing import Mapping, Sequence
+from typing import Final, List, Mapping, Sequence
 
 from iso639 import Lang
 
 from open_dubbing import logger
+from open_dubbing.model_registry import ModelRegistry
 from open_dubbing.pydub_audio_segment import AudioSegment
-from open_dubbing.voice_gender_classifier import VoiceGenderClassifier
+
+_MULTIPLE_SPACES: Final[re.Pattern] = re.compile(r"\s{2,}")
 
 
 class SpeechToText(ABC):
@@ -73,9 +75,52 @@ class SpeechToText(ABC):
     ) -> str:
         pass
 
+    def _transcribe_batch(
+        self,
+        *,
+        vocals_filepaths: Sequence[str],
+        source_language_iso_639_1: str,
+    ) -> List[str]:
+        """Transcribes several files. Backends that can run them in a single inference call override it."""
+        return [
+            self._transcribe(
+                vocals_filepath=vocals_filepath,
+                source_language_iso_639_1=source_language_iso_639_1,
+            )
+            for vocals_filepath in vocals_filepaths
+        ]
+
+    def _transcribe_files(
+        self, vocals_filepaths: Sequence[str], source_language_iso_639_1: str
+    ) -> List[str]:
+        try:
+            return self._transcribe_batch(
+                vocals_filepaths=vocals_filepaths,
+                source_language_iso_639_1=source_language_iso_639_1,
+            )
+        except Exception as e:
+            logger().error(
+                f"speech_to_text._transcribe_files. Batch failed, transcribing files one by one. Error: '{e}'"
+            )
+
+        texts = []
+        for path in vocals_filepaths:
+            try:
+                text = self._transcribe(
+                    vocals_filepath=path,
+                    source_language_iso_639_1=source_language_iso_639_1,
+                )
+            except Exception as e:
+                logger().error(
+                    f"speech_to_text.transcribe_audio_chunks. file '{path}', error: '{e}'"
+                )
+                text = ""
+            texts.append(text)
+        return texts
+
     # Whisper sometimes includes spaces at the begining of sentences or multiple spaces between words
     def _make_sure_single_space(self, sentence: str) -> str:
-        fixed = re.sub(r"\s{2,}", " ", sentence)
+        fixed = _MULTIPLE_SPACES.sub(" ", sentence)
         fixed = fixed.strip()
         return fixed
 
@@ -85,35 +130,39 @@ class SpeechToText(ABC):
         utterance_metadata: Sequence[Mapping[str, float | str]],
         source_language: str,
         no_dubbing_phrases: Sequence[str],
+        batch_size: int = 16,
     ) -> Sequence[Mapping[str, float | str]]:
+        """Transcribes the utterances in batches of similar duration."""
 
         logger().debug(f"transcribe_audio_chunks: {source_language}")
         iso_639_1 = self._get_iso_639_1(source_language)
 
-        updated_utterance_metadata = []
-        for item in utterance_metadata:
-            new_item = item.copy()
-            path = ""
-            try:
-                path = item["path"]
-                duration = item["end"] - item["start"]
-                if self._is_short_audio(duration=duration):
-                    transcribed_text = ""
-                    logger().debug(
-                        f"speech_to_text._is_short_audio. Audio is less than {self.MIN_SECS} second, skipping transcription of '{path}'."
-                    )
-                else:
-                    transcribed_text = self._transcribe(
-                        vocals_filepath=path,
-                        source_language_iso_639_1=iso_639_1,
-                    )
-                    transcribed_text = self._make_sure_single_space(transcribed_text)
-            except Exception as e:
-                logger().error(
-                    f"speech_to_text.transcribe_audio_chunks. file '{path}', error: '{e}'"
+        transcriptions = [""] * len(utterance_metadata)
+        indexes = []
+        for idx, item in enumerate(utterance_metadata):
+            duration = item["end"] - item["start"]
+            if self._is_short_audio(duration=duration):
+                logger().debug(
+                    f"speech_to_text._is_short_audio. Audio is less than {self.MIN_SECS} second, skipping transcription of '{item.get('path', '')}'."
                 )
-                transcribed_text = ""
+                continue
+            indexes.append(idx)
+
+        indexes.sort(
+            key=lambda idx: utterance_metadata[idx]["end"]
+            - utterance_metadata[idx]["start"]
+        )
+        batch_size = max(1, batch_size)
+        for i in range(0, len(indexes), batch_size):
+            batch = indexes[i : i + batch_size]
+            paths = [utterance_metadata[idx]["path"] for idx in batch]
+            texts = self._transcribe_files(paths, iso_639_1)
+            for idx, text in zip(batch, texts):
+                transcriptions[idx] = self._make_sure_single_space(text)
 
+        updated_utterance_metadata = []
+        for item, transcribed_text in zip(utterance_metadata, transcriptions):
+            new_item = item.copy()
             dubbing = len(transcribed_text) > 0
             logger().debug(
                 f"transcribe_audio_chunks. text: '{transcribed_text}' - dubbing: {dubbing}"
@@ -150,6 +199,20 @@ class SpeechToText(ABC):
         )
         return speaker_tuple
 
+    def _get_voice_gender_classifier(self):
+        # Imported here, it loads torch which is not needed by all the backends
+        from open_dubbing.voice_gender_classifier import VoiceGenderClassifier
+
+        return ModelRegistry.get(
+            "voice_gender_classifier",
+            self.device,
+            lambda: VoiceGenderClassifier(self.device),
+        )
+
+    def warmup(self) -> None:
+        """Loads the models used after the transcription, to overlap their loading with other work."""
+        self._get_voice_gender_classifier()
+
     def predict_gender(
         self,
         *,
@@ -158,7 +221,7 @@ class SpeechToText(ABC):
     ) -> Sequence[tuple[str, str]]:
 
         speaker_gender = {}
-        classifier = VoiceGenderClassifier(self.device)
+        classifier = self._get_voice_gender_classifier()
         speakers = self._get_unique_speakers_largest_audio(utterance_metadata)
         for speaker, path in speakers:
             gender = classifier.get_gender_for_file(path)
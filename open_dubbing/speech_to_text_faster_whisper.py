@@ -14,9 +14,14 @@
 
 import array
 
+from typing import List
+
 import numpy as np
 
-from faster_whisper import WhisperModel
+from faster_whisper import WhisperModel, decode_audio
+from faster_whisper.audio import pad_or_trim
+from faster_whisper.tokenizer import Tokenizer
+from faster_whisper.transcribe import get_compression_ratio
 
 from open_dubbing import logger
 from open_dubbing.speech_to_text import SpeechToText
@@ -24,16 +29,46 @@ from open_dubbing.speech_to_text import SpeechToText
 
 class SpeechToTextFasterWhisper(SpeechToText):
 
-    def __init__(self, *, model_name="medium", device="cpu", cpu_threads=0, vad=False):
+    _WEBRTC_SAMPLE_RATE = 16000
+    _WEBRTC_FRAME_MS = 30
+    _WEBRTC_AGGRESSIVENESS = 2
+    _WEBRTC_PADDING = 0.2  # seconds added around each speech region
+    # Defaults of WhisperModel.transcribe, applied to the batched transcriptions
+    _COMPRESSION_RATIO_THRESHOLD = 2.4
+    _LOG_PROB_THRESHOLD = -1.0
+    _NO_SPEECH_THRESHOLD = 0.6
+
+    def __init__(
+        self,
+        *,
+        model_name="medium",
+        device="cpu",
+        cpu_threads=0,
+        vad_method="off",
+        compute_type=None,
+        beam_size=1,
+    ):
         super().__init__(device=device, model_name=model_name, cpu_threads=cpu_threads)
-        self.vad = vad
+        self.vad_method = vad_method
+        self.compute_type = compute_type
+        self.beam_size = beam_size
+
+    def _get_compute_type(self):
+        if self.compute_type:
+            return self.compute_type
+
+        return "float16" if self.device == "cuda" else "int8"
 
     def load_model(self):
+        compute_type = self._get_compute_type()
+        logger().debug(
+            f"speech_to_text_faster_whisper.load_model. compute_type: {compute_type}"
+        )
         self._model = WhisperModel(
             model_size_or_path=self.model_name,
             device=self.device,
             cpu_threads=self.cpu_threads,
-            compute_type="float16" if self.device == "cuda" else "int8",
+            compute_type=compute_type,
         )
 
     def get_languages(self):
@@ -49,11 +84,135 @@ class SpeechToTextFasterWhisper(SpeechToText):
         vocals_filepath: str,
         source_language_iso_639_1: str,
     ) -> str:
+        options = {}
+        if self.vad_method == "webrtc":
+            clip_timestamps = self._get_speech_clip_timestamps(vocals_filepath)
+            if not clip_timestamps:
+                return ""
+            options["clip_timestamps"] = clip_timestamps
+
         segments, _ = self.model.transcribe(
-            vocals_filepath, source_language_iso_639_1, vad_filter=self.vad
+            vocals_filepath,
+            source_language_iso_639_1,
+            vad_filter=self.vad_method == "silero",
+            beam_size=self.beam_size,
+            condition_on_previous_text=False,
+            **options,
         )
         return " ".join(segment.text for segment in segments)
 
+    """ Transcribes the files in a single call to the model, as faster-whisper's
+        BatchedInferencePipeline does with the chunks of a long audio. Files with
+        VAD or longer than Whisper's 30 seconds window are transcribed one by one.
+        As in WhisperModel.transcribe, files without speech are left empty and the
+        ones that fail the compression ratio or log probability checks are
+        transcribed again one by one, with its temperature fallback."""
+
+    def _transcribe_batch(
+        self,
+        *,
+        vocals_filepaths,
+        source_language_iso_639_1,
+    ) -> List[str]:
+        if self.vad_method != "off" or len(vocals_filepaths) == 1:
+            return super()._transcribe_batch(
+                vocals_filepaths=vocals_filepaths,
+                source_language_iso_639_1=source_language_iso_639_1,
+            )
+
+        feature_extractor = self.model.feature_extractor
+        audios = [
+            decode_audio(path, sampling_rate=feature_extractor.sampling_rate)
+            for path in vocals_filepaths
+        ]
+        if any(len(audio) > feature_extractor.n_samples for audio in audios):
+            return super()._transcribe_batch(
+                vocals_filepaths=vocals_filepaths,
+                source_language_iso_639_1=source_language_iso_639_1,
+            )
+
+        features = np.stack(
+            [pad_or_trim(feature_extractor(audio)[..., :-1]) for audio in audios]
+        )
+        tokenizer = Tokenizer(
+            self.model.hf_tokenizer,
+            self.model.model.is_multilingual,
+            task="transcribe",
+            language=source_language_iso_639_1,
+        )
+        prompt = self.model.get_prompt(
+            tokenizer, previous_tokens=[], without_timestamps=True
+        )
+        encoder_output = self.model.encode(features)
+        results = self.model.model.generate(
+            encoder_output,
+            [prompt] * len(audios),
+            beam_size=self.beam_size,
+            max_length=self.model.max_length,
+            return_scores=True,
+            return_no_speech_prob=True,
+            suppress_blank=True,
+            suppress_tokens=[-1],
+        )
+
+        texts = []
+        for path, result in zip(vocals_filepaths, results):
+            tokens = result.sequences_ids[0]
+            text = tokenizer.decode(tokens)
+            # Scores are normalized by the length, as in faster-whisper
+            avg_logprob = result.scores[0] * len(tokens) / (len(tokens) + 1)
+            if (
+                result.no_speech_prob > self._NO_SPEECH_THRESHOLD
+                and avg_logprob < self._LOG_PROB_THRESHOLD
+            ):
+                text = ""
+            elif (
+                get_compression_ratio(text) > self._COMPRESSION_RATIO_THRESHOLD
+                or avg_logprob < self._LOG_PROB_THRESHOLD
+            ):
+                logger().debug(
+                    f"speech_to_text_faster_whisper._transcribe_batch. Transcribing again '{path}', avg_logprob: {avg_logprob:.2f}"
+                )
+                text = self._transcribe(
+                    vocals_filepath=path,
+                    source_language_iso_639_1=source_language_iso_639_1,
+                )
+            texts.append(text)
+        return texts
+
+    """ Returns the speech regions found by WebRTC VAD as a flat list of
+        start and end seconds, the format expected by faster-whisper's clip_timestamps."""
+
+    def _get_speech_clip_timestamps(self, vocals_filepath: str) -> List[float]:
+        import webrtcvad
+
+        sample_rate = self._WEBRTC_SAMPLE_RATE
+        audio = decode_audio(vocals_filepath, sampling_rate=sample_rate)
+        pcm = (np.clip(audio, -1, 1) * 32767).astype(np.int16)
+        frame_size = sample_rate * self._WEBRTC_FRAME_MS // 1000
+        duration = len(pcm) / sample_rate
+
+        vad = webrtcvad.Vad(self._WEBRTC_AGGRESSIVENESS)
+        timestamps = []
+        for offset in range(0, len(pcm) - frame_size + 1, frame_size):
+            frame = pcm[offset : offset + frame_size].tobytes()
+            if not vad.is_speech(frame, sample_rate):
+                continue
+
+            start = max(0.0, offset / sample_rate - self._WEBRTC_PADDING)
+            end = min(
+                duration, (offset + frame_size) / sample_rate + self._WEBRTC_PADDING
+            )
+            if timestamps and start <= timestamps[-1]:
+                timestamps[-1] = end
+            else:
+                timestamps.extend([start, end])
+
+        logger().debug(
+            f"speech_to_text_faster_whisper._get_speech_clip_timestamps. {vocals_filepath}: {timestamps}"
+        )
+        return timestamps
+
     def _get_audio_language(self, audio: array.array) -> str:
         audio_input = np.array(audio).astype(np.float32) / 32768.0
         _, info = self.model.transcribe(audio_input)
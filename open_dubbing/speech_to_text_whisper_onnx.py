@@ -0,0 +1,100 @@
+# Copyright 2024 Jordi Mas i Hernàndez <jmas@softcatala.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+
+import onnxruntime
+
+from optimum.onnxruntime import ORTModelForSpeechSeq2Seq
+from transformers import WhisperProcessor
+
+from open_dubbing import get_cache_directory, logger
+from open_dubbing.speech_to_text_whisper_transformers import (
+    SpeechToTextWhisperTransformers,
+)
+
+
+class SpeechToTextWhisperONNX(SpeechToTextWhisperTransformers):
+
+    # Models whose MatMul weights are quantized to 4 bits after the export
+    _INT4_MODELS = ["large-v3-turbo"]
+    _INT4_BLOCK_SIZE = 32
+
+    def _get_session_options(self):
+        session_options = onnxruntime.SessionOptions()
+        session_options.graph_optimization_level = (
+            onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        if self.cpu_threads > 0:
+            session_options.intra_op_num_threads = self.cpu_threads
+        return session_options
+
+    def _get_provider(self):
+        if self.device == "cuda":
+            return "CUDAExecutionProvider"
+        return "CPUExecutionProvider"
+
+    def _quantize_int4(self, model_dir: str):
+        import onnx
+
+        from onnxruntime.quantization.matmul_nbits_quantizer import MatMulNBitsQuantizer
+
+        for filename in os.listdir(model_dir):
+            if not filename.endswith(".onnx"):
+                continue
+
+            path = os.path.join(model_dir, filename)
+            logger().info(f"Quantizing {path} to int4")
+            quantizer = MatMulNBitsQuantizer(
+                onnx.load(path),
+                block_size=self._INT4_BLOCK_SIZE,
+                is_symmetric=True,
+            )
+            quantizer.process()
+            quantizer.model.save_model_to_file(path, use_external_data_format=False)
+
+        # Weights of the float model larger than 2GB are stored apart
+        for filename in os.listdir(model_dir):
+            if filename.endswith(".onnx_data"):
+                os.remove(os.path.join(model_dir, filename))
+
+    # The model is exported to ONNX only the first time and reused afterwards
+    def _get_exported_model(self, full_model_name: str) -> str:
+        int4 = self.model_name in self._INT4_MODELS
+        suffix = "-int4" if int4 else ""
+        model_dir = os.path.join(
+            get_cache_directory("onnx"), f"whisper-{self.model_name}{suffix}"
+        )
+        if os.path.exists(model_dir):
+            return model_dir
+
+        logger().info(f"Exporting speech to text model {full_model_name} to ONNX")
+        tmp_dir = model_dir + ".tmp"
+        model = ORTModelForSpeechSeq2Seq.from_pretrained(full_model_name, export=True)
+        model.save_pretrained(tmp_dir)
+        if int4:
+            self._quantize_int4(tmp_dir)
+        shutil.move(tmp_dir, model_dir)
+        return model_dir
+
+    def load_model(self):
+        full_model_name = f"openai/whisper-{self.model_name}"
+        self._processor = WhisperProcessor.from_pretrained(full_model_name)
+        model_dir = self._get_exported_model(full_model_name)
+        self._model = ORTModelForSpeechSeq2Seq.from_pretrained(
+            model_dir,
+            provider=self._get_provider(),
+            session_options=self._get_session_options(),
+        )
@@ -20,62 +20,91 @@ import torch
 from transformers import WhisperForConditionalGeneration, WhisperProcessor
 
 from open_dubbing import logger
+from open_dubbing.mixed_precision import get_half_precision_dtype
 from open_dubbing.pydub_audio_segment import AudioSegment
 from open_dubbing.speech_to_text import SpeechToText
 
 
 class SpeechToTextWhisperTransformers(SpeechToText):
 
-    def __init__(self, *, model_name="medium", device="cpu", cpu_threads=0):
+    def __init__(
+        self, *, model_name="medium", device="cpu", cpu_threads=0, beam_size=1
+    ):
         super().__init__(device=device, model_name=model_name, cpu_threads=cpu_threads)
         self._processor = None
+        self.beam_size = beam_size
+        self._torch_dtype = None
 
     def load_model(self):
         full_model_name = f"openai/whisper-{self.model_name}"
         self._processor = WhisperProcessor.from_pretrained(full_model_name)
-        self._model = WhisperForConditionalGeneration.from_pretrained(full_model_name)
+        self._torch_dtype = get_half_precision_dtype(self.device) or torch.float32
+        self._model = WhisperForConditionalGeneration.from_pretrained(
+            full_model_name, torch_dtype=self._torch_dtype
+        ).to(self.device)
 
-    def _transcribe(
-        self,
-        *,
-        vocals_filepath: str,
-        source_language_iso_639_1: str,
-    ) -> str:
+    def _get_input_features(self, audio_inputs):
+        input_features = self._processor(
+            audio_inputs, sampling_rate=16000, return_tensors="pt"
+        ).input_features
+        # The ONNX Runtime models take care of placing the inputs themselves
+        if not self._torch_dtype:
+            return input_features
+
+        # From page-locked memory the copy to the GPU is asynchronous
+        if self.device.startswith("cuda"):
+            input_features = input_features.pin_memory()
+        return input_features.to(
+            self.device, dtype=self._torch_dtype, non_blocking=True
+        )
 
+    def _load_audio(self, vocals_filepath: str) -> np.ndarray:
         audio = AudioSegment.from_file(vocals_filepath)
         audio = audio.set_channels(1)  # Convert to mono
         audio = audio.set_frame_rate(16000)  # Set the frame rate to 16kHz
         # Convert the audio to a numpy array
-        audio_input = (
+        return (
             np.array(audio.get_array_of_samples()).astype(np.float32) / 32768.0
         )  # Normalize
 
-        # Preprocess the audio input
-        input_features = self._processor(
-            audio_input, sampling_rate=16000, return_tensors="pt"
-        ).input_features
+    def _transcribe(
+        self,
+        *,
+        vocals_filepath: str,
+        source_language_iso_639_1: str,
+    ) -> str:
+        return self._transcribe_batch(
+            vocals_filepaths=[vocals_filepath],
+            source_language_iso_639_1=source_language_iso_639_1,
+        )[0]
 
-        with torch.no_grad():
+    def _transcribe_batch(self, *, vocals_filepaths, source_language_iso_639_1):
+        audio_inputs = [self._load_audio(path) for path in vocals_filepaths]
+
+        # Preprocess the audio inputs, all padded to Whisper's 30 seconds window
+        input_features = self._get_input_features(audio_inputs)
+
+        with torch.inference_mode():
             generated_ids = self._model.generate(
-                input_features, language=source_language_iso_639_1
+                input_features,
+                language=source_language_iso_639_1,
+                num_beams=self.beam_size,
             )
-        transcription = self._processor.batch_decode(
+        transcriptions = self._processor.batch_decode(
             generated_ids, skip_special_tokens=True
-        )[0]
+        )
         logger().debug(
-            f"speech_to_text_whisper_transfomers._transcribe. transcription: {transcription}, file {vocals_filepath}"
+            f"speech_to_text_whisper_transfomers._transcribe_batch. transcriptions: {transcriptions}, files {vocals_filepaths}"
         )
-        return transcription
+        return transcriptions
 
     def _get_audio_language(self, audio: array.array) -> str:
         audio_input = np.array(audio).astype(np.float32) / 32768.0
 
         # Preprocess the audio input
-        input_features = self._processor(
-            audio_input, sampling_rate=16000, return_tensors="pt"
-        ).input_features
+        input_features = self._get_input_features(audio_input)
 
-        with torch.no_grad():
+        with torch.inference_mode():
             generated_ids = self._model.generate(input_features)
 
         # Decode the transcription including special tokens to capture the language token
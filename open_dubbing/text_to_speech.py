@@ -12,10 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import functools
 import math
 import os
 
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from typing import Final, List, Mapping, NamedTuple, Sequence
 
 from open_dubbing import logger
@@ -24,6 +26,13 @@ from open_dubbing.pydub_audio_segment import AudioSegment
 from open_dubbing.utterance import Utterance
 
 
+# The modification time and size are part of the key, so a different file
+# written to the same path is decoded again
+@functools.lru_cache(maxsize=8)
+def _get_duration_seconds(audio_file: str, mtime_ns: int, size: int) -> float:
+    return AudioSegment.from_mp3(audio_file).duration_seconds
+
+
 class Voice(NamedTuple):
     name: str
     gender: str
@@ -36,6 +45,7 @@ class TextToSpeech(ABC):
         self._SSML_MALE: Final[str] = "Male"
         self._SSML_FEMALE: Final[str] = "Female"
         self._DEFAULT_SPEED: Final[float] = 1.0
+        self.streaming = False
 
     @abstractmethod
     def get_available_voices(self, language_code: str) -> List[Voice]:
@@ -152,6 +162,14 @@ class TextToSpeech(ABC):
     def get_languages(self):
         pass
 
+    def warmup(self, *, target_language: str) -> None:
+        """Loads the models used for the target language, to overlap their loading with other work.
+
+        Engines that load their models the first time that they convert a text
+        override it.
+        """
+        pass
+
     """ TTS add silence at the end that we want to remove to prevent increasing the speech of next
         segments if is not necessary."""
 
@@ -198,6 +216,19 @@ class TextToSpeech(ABC):
     ) -> str:
         pass
 
+    def _prepare_utterances(
+        self,
+        *,
+        utterances: Sequence[Mapping[str, str | float]],
+        target_language: str,
+    ) -> None:
+        """Called with all the utterances to dub before they are converted one by one.
+
+        Engines that can synthesize several texts in a single inference call
+        override it to do so.
+        """
+        pass
+
     def _calculate_target_utterance_speed(
         self,
         *,
@@ -228,6 +259,18 @@ class TextToSpeech(ABC):
     def _does_voice_supports_speeds(self):
         return False
 
+    def _does_support_streaming(self):
+        return False
+
+    def enable_streaming(self, enabled: bool) -> None:
+        """Writes the audio while it is received instead of when it is complete."""
+        if enabled and not self._does_support_streaming():
+            logger().warning(
+                f"text_to_speech.enable_streaming. {type(self).__name__} does not support streaming, ignoring it"
+            )
+            return
+        self.streaming = enabled
+
     def get_start_time_of_next_speech_utterance(
         self,
         *,
@@ -251,8 +294,11 @@ class TextToSpeech(ABC):
 
         if not result:
             try:
-                background_audio = AudioSegment.from_mp3(audio_file)
-                total_duration = background_audio.duration_seconds
+                # Decoded only once for all the utterances of the file
+                stat = os.stat(audio_file)
+                total_duration = _get_duration_seconds(
+                    audio_file, stat.st_mtime_ns, stat.st_size
+                )
                 logger().debug(
                     f"get_start_time_of_next_speech_utterance. File duration: {total_duration}"
                 )
@@ -268,6 +314,94 @@ class TextToSpeech(ABC):
         )
         return result
 
+    def _dub_utterance(
+        self,
+        *,
+        utterance: Mapping[str, str | float],
+        utterance_metadata: Sequence[Mapping[str, str | float]],
+        output_directory: str,
+        target_language: str,
+        audio_file: str,
+    ) -> Mapping[str, str | float]:
+        utterance_copy = utterance.copy()
+        if not utterance_copy["for_dubbing"]:
+            try:
+                dubbed_path = utterance_copy["path"]
+            except KeyError:
+                dubbed_path = f"chunk_{utterance['start']}_{utterance['end']}.mp3"
+        else:
+            assigned_voice = utterance_copy["assigned_voice"]
+            text = utterance_copy["translated_text"]
+            try:
+                path = utterance_copy["path"]
+                base_filename = os.path.splitext(os.path.basename(path))[0]
+                output_filename = os.path.join(
+                    output_directory, f"dubbed_{base_filename}.mp3"
+                )
+            except KeyError:
+                output_filename = os.path.join(
+                    output_directory,
+                    f"dubbed_chunk_{utterance['start']}_{utterance['end']}.mp3",
+                )
+
+            speed = utterance_copy["speed"]
+            dubbed_path = self._convert_text_to_speech_without_end_silence(
+                assigned_voice=assigned_voice,
+                target_language=target_language,
+                output_filename=output_filename,
+                text=text,
+                speed=speed,
+            )
+            assigned_voice = utterance_copy.get("assigned_voice", None)
+            assigned_voice = assigned_voice if assigned_voice else ""
+            support_speeds = self._does_voice_supports_speeds()
+
+            start = utterance["start"]
+            end = utterance["end"]
+            speed = self._calculate_target_utterance_speed(
+                start=start,
+                end=end,
+                dubbed_file=dubbed_path,
+                utterance_metadata=utterance_metadata,
+                audio_file=audio_file,
+            )
+
+            logger().debug(f"support_speeds: {support_speeds}, speed: {speed}")
+
+            if speed > 1.0:
+                translated_text = utterance_copy["translated_text"]
+                logger().debug(
+                    f"text_to_speech.dub_utterances. Need to increase speed for '{translated_text}'"
+                )
+
+                MAX_SPEED = 1.3
+                if speed > MAX_SPEED:
+                    logger().debug(
+                        f"text_to_speech.dub_utterances: Reduced speed from {speed} to {MAX_SPEED}"
+                    )
+                    speed = MAX_SPEED
+
+                translated_text = utterance_copy["translated_text"]
+                logger().debug(
+                    f"text_to_speech.dub_utterances: Adjusting speed to {speed} for '{translated_text}'"
+                )
+
+                utterance_copy["speed"] = speed
+                if support_speeds:
+                    dubbed_path = self._convert_text_to_speech_without_end_silence(
+                        assigned_voice=assigned_voice,
+                        target_language=target_language,
+                        output_filename=output_filename,
+                        text=text,
+                        speed=speed,
+                    )
+                # Otherwise the speed of the file is adjusted with FFmpeg in dub_utterances
+            else:
+                utterance_copy["speed"] = self._DEFAULT_SPEED
+
+        utterance_copy["dubbed_path"] = dubbed_path
+        return utterance_copy
+
     def dub_utterances(
         self,
         *,
@@ -276,103 +410,54 @@ class TextToSpeech(ABC):
         target_language: str,
         audio_file: str,
         modified_metadata: Sequence[Mapping[str, str | float]] | None = None,
+        concurrency: int = 1,
     ) -> Sequence[Mapping[str, str | float]]:
-        """Processes a list of utterance metadata, generating dubbed audio files."""
+        """Processes a list of utterance metadata, generating dubbed audio files.
+
+        Up to 'concurrency' utterances are synthesized at the same time.
+        """
 
         modified_ids = {}
         if modified_metadata is not None:
             modified_ids = {utterance["id"] for utterance in modified_metadata}
 
-        updated_utterance_metadata = []
-        for utterance in utterance_metadata:
-            if modified_metadata is not None and utterance["id"] not in modified_ids:
-                utterance_copy = utterance.copy()
-                updated_utterance_metadata.append(utterance_copy)
-                continue
-
-            utterance_copy = utterance.copy()
-            if not utterance_copy["for_dubbing"]:
-                try:
-                    dubbed_path = utterance_copy["path"]
-                except KeyError:
-                    dubbed_path = f"chunk_{utterance['start']}_{utterance['end']}.mp3"
-            else:
-                assigned_voice = utterance_copy["assigned_voice"]
-                text = utterance_copy["translated_text"]
-                try:
-                    path = utterance_copy["path"]
-                    base_filename = os.path.splitext(os.path.basename(path))[0]
-                    output_filename = os.path.join(
-                        output_directory, f"dubbed_{base_filename}.mp3"
-                    )
-                except KeyError:
-                    output_filename = os.path.join(
-                        output_directory,
-                        f"dubbed_chunk_{utterance['start']}_{utterance['end']}.mp3",
-                    )
-
-                speed = utterance_copy["speed"]
-                dubbed_path = self._convert_text_to_speech_without_end_silence(
-                    assigned_voice=assigned_voice,
-                    target_language=target_language,
-                    output_filename=output_filename,
-                    text=text,
-                    speed=speed,
-                )
-                assigned_voice = utterance_copy.get("assigned_voice", None)
-                assigned_voice = assigned_voice if assigned_voice else ""
-                support_speeds = self._does_voice_supports_speeds()
-
-                start = utterance["start"]
-                end = utterance["end"]
-                speed = self._calculate_target_utterance_speed(
-                    start=start,
-                    end=end,
-                    dubbed_file=dubbed_path,
-                    utterance_metadata=utterance_metadata,
-                    audio_file=audio_file,
-                )
+        def _is_modified(utterance):
+            return modified_metadata is None or utterance["id"] in modified_ids
 
-                logger().debug(f"support_speeds: {support_speeds}, speed: {speed}")
+        self._prepare_utterances(
+            utterances=[
+                utterance
+                for utterance in utterance_metadata
+                if utterance["for_dubbing"] and _is_modified(utterance)
+            ],
+            target_language=target_language,
+        )
 
-                if speed > 1.0:
-                    translated_text = utterance_copy["translated_text"]
-                    logger().debug(
-                        f"text_to_speech.dub_utterances. Need to increase speed for '{translated_text}'"
-                    )
+        def _process(utterance):
+            if not _is_modified(utterance):
+                return utterance.copy()
 
-                    MAX_SPEED = 1.3
-                    if speed > MAX_SPEED:
-                        logger().debug(
-                            f"text_to_speech.dub_utterances: Reduced speed from {speed} to {MAX_SPEED}"
-                        )
-                        speed = MAX_SPEED
+            return self._dub_utterance(
+                utterance=utterance,
+                utterance_metadata=utterance_metadata,
+                output_directory=output_directory,
+                target_language=target_language,
+                audio_file=audio_file,
+            )
 
-                    translated_text = utterance_copy["translated_text"]
-                    logger().debug(
-                        f"text_to_speech.dub_utterances: Adjusting speed to {speed} for '{translated_text}'"
-                    )
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            updated_utterance_metadata = list(
+                executor.map(_process, utterance_metadata)
+            )
 
-                    utterance_copy["speed"] = speed
-                    if support_speeds:
-                        dubbed_path = self._convert_text_to_speech_without_end_silence(
-                            assigned_voice=assigned_voice,
-                            target_language=target_language,
-                            output_filename=output_filename,
-                            text=text,
-                            speed=speed,
-                        )
-                    else:
-                        FFmpeg().adjust_audio_speed(
-                            filename=dubbed_path,
-                            speed=speed,
-                        )
-                        logger().debug(
-                            f"text_to_speech.adjust_audio_speed: dubbed_audio: {dubbed_path}, speed: {speed}"
-                        )
-                else:
-                    utterance_copy["speed"] = self._DEFAULT_SPEED
-
-            utterance_copy["dubbed_path"] = dubbed_path
-            updated_utterance_metadata.append(utterance_copy)
+        if not self._does_voice_supports_speeds():
+            FFmpeg().batch_adjust_audio_speed(
+                [
+                    (utterance["dubbed_path"], utterance["speed"])
+                    for utterance in updated_utterance_metadata
+                    if utterance["for_dubbing"]
+                    and _is_modified(utterance)
+                    and utterance["speed"] > self._DEFAULT_SPEED
+                ]
+            )
         return updated_utterance_metadata
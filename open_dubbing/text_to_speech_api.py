@@ -15,7 +15,7 @@
 import tempfile
 import time
 
-from typing import List
+from typing import Final, List
 from urllib.parse import urljoin
 
 import requests
@@ -23,6 +23,8 @@ import requests
 from open_dubbing import logger
 from open_dubbing.text_to_speech import TextToSpeech, Voice
 
+_STREAM_CHUNK_SIZE: Final[int] = 64 * 1024
+
 
 class TextToSpeechAPI(TextToSpeech):
 
@@ -64,6 +66,9 @@ class TextToSpeechAPI(TextToSpeech):
     def _does_voice_supports_speeds(self):
         return False
 
+    def _does_support_streaming(self):
+        return True
+
     def _convert_text_to_speech(
         self,
         *,
@@ -80,7 +85,7 @@ class TextToSpeechAPI(TextToSpeech):
         max_retries = 3
         for attempt in range(1, max_retries + 1):
             try:
-                response = requests.get(url)
+                response = requests.get(url, stream=self.streaming)
 
                 temp_filename = None
                 with tempfile.NamedTemporaryFile(delete=False) as temporary_file:
@@ -88,7 +93,13 @@ class TextToSpeechAPI(TextToSpeech):
 
                     if response.status_code == 200:
                         with open(temp_filename, "wb") as f:
-                            f.write(response.content)
+                            if self.streaming:
+                                for chunk in response.iter_content(
+                                    chunk_size=_STREAM_CHUNK_SIZE
+                                ):
+                                    f.write(chunk)
+                            else:
+                                f.write(response.content)
                     else:
                         response.raise_for_status()
 
@@ -14,6 +14,7 @@
 
 import json
 import os
+import threading
 
 from typing import List
 
@@ -28,6 +29,9 @@ class TextToSpeechCLI(TextToSpeech):
         self.device = device
         self.configuration = self.load_json(configuration_file)
         self.output_dir = os.path.abspath("tts-output/")
+        # The command writes to a fixed output pattern, e.g. one file per
+        # voice, so concurrent utterances would overwrite each other's audio
+        self._lock = threading.Lock()
 
     def load_json(self, configuration_file):
         with open(configuration_file, "r") as file:
@@ -86,18 +90,19 @@ class TextToSpeechCLI(TextToSpeech):
         cmd = self._get_command(
             assigned_voice=assigned_voice, text=text, directory=self.output_dir
         )
-        return_code = os.system(cmd)
-        if return_code != 0:
-            raise RuntimeError(
-                f"Command '{cmd}' failed with return code: {return_code}"
+        with self._lock:
+            return_code = os.system(cmd)
+            if return_code != 0:
+                raise RuntimeError(
+                    f"Command '{cmd}' failed with return code: {return_code}"
+                )
+
+            wav_file = self._get_output_pattern(
+                assigned_voice=assigned_voice,
+                text=text,
+                directory=self.output_dir,
             )
-
-        wav_file = self._get_output_pattern(
-            assigned_voice=assigned_voice,
-            text=text,
-            directory=self.output_dir,
-        )
-        self._convert_to_mp3(wav_file, output_filename)
+            self._convert_to_mp3(wav_file, output_filename)
 
         logger().debug(f"text_to_speech_cli._convert_text_to_speech: {text}")
         return output_filename
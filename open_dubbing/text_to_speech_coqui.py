@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import threading
+
 from typing import List
 
 from iso639 import Lang
@@ -28,6 +30,7 @@ class TextToSpeechCoqui(TextToSpeech):
     def __init__(self, device="cpu"):
         super().__init__()
         self.coqui = Coqui(device)
+        self._lock = threading.Lock()
 
     def get_languages(self):
         languages = []
@@ -75,9 +78,10 @@ class TextToSpeechCoqui(TextToSpeech):
             f"text_to_speech.client.synthesize_speech: pre synthesize_speech: '{text}', '{target_language}', file: {wav_file}, speed: {speed}, voice: {assigned_voice}"
         )
         iso_639_1 = self._get_iso_639_1(target_language)
-        self.coqui.synthesize_speech(
-            text, iso_639_1, file_path=wav_file, voice=assigned_voice
-        )
+        with self._lock:
+            self.coqui.synthesize_speech(
+                text, iso_639_1, file_path=wav_file, voice=assigned_voice
+            )
 
         self._convert_to_mp3(wav_file, output_filename)
         logger().debug(
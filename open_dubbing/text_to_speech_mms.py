@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import threading
+
 from typing import List
 
 import numpy as np
@@ -26,13 +28,74 @@ from open_dubbing.text_to_speech import TextToSpeech, Voice
 
 class TextToSpeechMMS(TextToSpeech):
 
+    _BATCH_SIZE = 8
+
     def __init__(self, device="cpu"):
         super().__init__()
         self.device = device
+        self._models = {}
+        self._lock = threading.Lock()
+        self._waveforms = {}
+
+    def _get_model(self, target_language: str):
+        if target_language not in self._models:
+            local_files_only = False
+            model = VitsModel.from_pretrained(
+                f"facebook/mms-tts-{target_language}",
+                local_files_only=local_files_only,
+            ).to(self.device)
+            tokenizer = AutoTokenizer.from_pretrained(
+                f"facebook/mms-tts-{target_language}",
+                local_files_only=local_files_only,
+            )
+            self._models[target_language] = (model, tokenizer)
+
+        return self._models[target_language]
+
+    def warmup(self, *, target_language: str) -> None:
+        with self._lock:
+            self._get_model(target_language)
 
     def get_available_voices(self, language_code: str) -> List[Voice]:
         return [Voice(name="voice", gender=self._SSML_MALE)]
 
+    def _to_pcm(self, waveform: np.ndarray) -> np.ndarray:
+        waveform = np.clip(waveform, -1, 1)  # Clip values to be between -1 and 1
+        return (waveform * 32767).astype(np.int16)  # Scale to 16-bit PCM
+
+    # Synthesizes the texts in padded batches, sorted by length to reduce the
+    # padding. The waveforms are then written by _convert_text_to_speech
+    def _prepare_utterances(self, *, utterances, target_language):
+        self._waveforms = {}
+        texts = sorted(
+            {utterance["translated_text"] for utterance in utterances}, key=len
+        )
+
+        # Texts that are not synthesized here are converted one by one
+        with self._lock:
+            model, tokenizer = self._get_model(target_language)
+            texts = [text for text in texts if len(tokenizer(text)["input_ids"]) > 0]
+            for i in range(0, len(texts), self._BATCH_SIZE):
+                batch = texts[i : i + self._BATCH_SIZE]
+                try:
+                    inputs = tokenizer(batch, padding=True, return_tensors="pt").to(
+                        self.device
+                    )
+                    with torch.inference_mode():
+                        output = model(**inputs)
+                except Exception as e:
+                    logger().error(
+                        f"TextToSpeechMMS._prepare_utterances. Batch failed, error: '{e}'"
+                    )
+                    continue
+
+                for text, waveform, length in zip(
+                    batch, output.waveform, output.sequence_lengths
+                ):
+                    self._waveforms[(target_language, text)] = self._to_pcm(
+                        waveform[:length].cpu().numpy()
+                    )
+
     def _convert_text_to_speech(
         self,
         *,
@@ -44,19 +107,18 @@ class TextToSpeechMMS(TextToSpeech):
     ) -> str:
 
         logger().debug(f"TextToSpeechMMS._convert_text_to_speech: {text}")
-        local_files_only = False
 
-        # Load pre-trained model and tokenizer
-        model = VitsModel.from_pretrained(
-            f"facebook/mms-tts-{target_language}", local_files_only=local_files_only
-        ).to(self.device)
-        tokenizer = AutoTokenizer.from_pretrained(
-            f"facebook/mms-tts-{target_language}", local_files_only=local_files_only
-        )
-        inputs = tokenizer(text, return_tensors="pt").to(self.device)
+        # The model runs one utterance at a time since torch already uses all
+        # the cores. Concurrent utterances overlap with the ffmpeg conversions
+        with self._lock:
+            model, tokenizer = self._get_model(target_language)
+            sampling_rate = model.config.sampling_rate
+            output_np = self._waveforms.get((target_language, text))
+            if output_np is None:
+                inputs = tokenizer(text, return_tensors="pt").to(self.device)
 
         # Model returns for some sequences of tokens no result
-        if inputs["input_ids"].shape[1] == 0:
+        if output_np is None and inputs["input_ids"].shape[1] == 0:
             sampling_rate = 16000
             duration_seconds = 1
             # If we fill the array with (np.zeros) the ffmpeg process later fails
@@ -64,20 +126,12 @@ class TextToSpeechMMS(TextToSpeech):
             logger().warning(
                 f"TextToSpeechMMS._convert_text_to_speech. Model returns input tokens for text '{text}', generating an empty WAV file."
             )
-        else:
-            with torch.no_grad():
+        elif output_np is None:
+            with self._lock, torch.inference_mode():
                 output = model(**inputs).waveform
 
-            # Convert waveform to NumPy array and scale to 16-bit PCM
-            # Assuming `output` is a 2D tensor with shape (batch_size, samples)
-            output_np = (
-                output.squeeze().cpu().numpy()
-            )  # Remove batch dimension if present
-            output_np = np.clip(output_np, -1, 1)  # Clip values to be between -1 and 1
-            output_np = (output_np * 32767).astype(np.int16)  # Scale to 16-bit PCM
-
-            # Get the sampling rate
-            sampling_rate = model.config.sampling_rate
+            # Remove the batch dimension and convert to 16-bit PCM
+            output_np = self._to_pcm(output.squeeze().cpu().numpy())
 
         # Write to WAV file
         wav_file = output_filename.replace(".mp3", ".wav")
@@ -59,6 +59,9 @@ class TextToSpeechOpenAI(TextToSpeech):
     def _does_voice_supports_speeds(self):
         return False
 
+    def _does_support_streaming(self):
+        return True
+
     def _convert_text_to_speech(
         self,
         *,
@@ -72,13 +75,20 @@ class TextToSpeechOpenAI(TextToSpeech):
         logger().debug(
             f"text_to_speech_openai._convert_text_to_speech: assigned_voice: {assigned_voice}, output_filename: '{output_filename}'"
         )
-        response = self.client.audio.speech.create(
-            model="tts-1",
-            voice=assigned_voice,
-            input=text,
-        )
-
-        response.stream_to_file(output_filename)
+        if self.streaming:
+            with self.client.audio.speech.with_streaming_response.create(
+                model="tts-1",
+                voice=assigned_voice,
+                input=text,
+            ) as response:
+                response.stream_to_file(output_filename)
+        else:
+            response = self.client.audio.speech.create(
+                model="tts-1",
+                voice=assigned_voice,
+                input=text,
+            )
+            response.stream_to_file(output_filename)
 
         return output_filename
 
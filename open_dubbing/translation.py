@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
 import json
 import re
 import time
@@ -20,14 +21,16 @@ from abc import ABC, abstractmethod
 from typing import Final, Mapping, Sequence
 
 from open_dubbing import logger
+from open_dubbing.cache import Cache
 
 _BREAK_MARKER: Final[str] = "<BREAK>"
 
 
 class Translation(ABC):
 
-    def __init__(self, device="cpu"):
+    def __init__(self, device="cpu", batch_size=16):
         self.device = device
+        self.batch_size = batch_size
 
     @abstractmethod
     def load_model(self):
@@ -53,12 +56,73 @@ class Translation(ABC):
     ) -> str:
         pass
 
+    def _translate_batch(
+        self, source_language: str, target_language: str, texts: Sequence[str]
+    ) -> Sequence[str]:
+        """Translates a batch of texts. Backends that can batch inference override it."""
+        return [
+            self._translate_text(
+                source_language=source_language,
+                target_language=target_language,
+                text=text,
+            )
+            for text in texts
+        ]
+
+    def _get_cache_id(self) -> str:
+        """Identifies the translations of the engine and model in the cache."""
+        return f"{type(self).__name__}:{getattr(self, 'model_name', '')}"
+
+    def _get_cache_key(
+        self, source_language: str, target_language: str, text: str
+    ) -> str:
+        text_hash = hashlib.sha256(text.encode()).hexdigest()
+        return f"translation:{self._get_cache_id()}:{source_language}:{target_language}:{text_hash}"
+
+    def _translate_texts(
+        self,
+        source_language: str,
+        target_language: str,
+        texts: Sequence[str],
+        cache: Cache | None = None,
+    ) -> Sequence[str]:
+        """Translates texts in batches of similar length to minimize padding.
+
+        Texts found in the cache (e.g. from a previous run) are not translated again.
+        """
+        translations = [""] * len(texts)
+        keys = [
+            self._get_cache_key(source_language, target_language, text)
+            for text in texts
+        ]
+        pending = []
+        for idx, key in enumerate(keys):
+            cached = cache.get(key) if cache else None
+            if cached is None:
+                pending.append(idx)
+            else:
+                translations[idx] = cached
+
+        order = sorted(pending, key=lambda idx: len(texts[idx]))
+        for pos in range(0, len(order), self.batch_size):
+            indices = order[pos : pos + self.batch_size]
+            batch = self._translate_batch(
+                source_language, target_language, [texts[idx] for idx in indices]
+            )
+            for idx, translation in zip(indices, batch):
+                translations[idx] = translation
+
+        if cache and pending:
+            cache.set_many({keys[idx]: translations[idx] for idx in pending})
+        return translations
+
     def translate_utterances(
         self,
         *,
         utterance_metadata: Sequence[Mapping[str, str | float]],
         source_language: str,
         target_language: str,
+        cache: Cache | None = None,
     ) -> Sequence[Mapping[str, str | float]]:
 
         script = self._generate_script(utterance_metadata=utterance_metadata)
@@ -66,6 +130,7 @@ class Translation(ABC):
             script=script,
             source_language=source_language,
             target_language=target_language,
+            cache=cache,
         )
         return self._add_translations(
             utterance_metadata=utterance_metadata,
@@ -78,6 +143,7 @@ class Translation(ABC):
         script: str,
         source_language: str,
         target_language: str,
+        cache: Cache | None = None,
     ) -> str:
         """Translates the provided transcript to the target language.
         Input: <BREAK>Hello, my name is Jordi Mas.<BREAK>I'm from Barcelona<BREAK>and I also work in Barcelona.<BREAK>Thanks a lot for listening.<BREAK>For.<BREAK>
@@ -95,18 +161,13 @@ class Translation(ABC):
         # Split the input string by the <BREAK> delimiter
         parts = script.split(_BREAK_MARKER)
 
-        translated_parts = []
-        for text in parts:
-            if len(text.strip()) == 0:
-                translation = ""
-            else:
-                translation = self._translate_text(
-                    source_language=source_language,
-                    target_language=target_language,
-                    text=text,
-                )
-
-            translated_parts.append(translation)
+        indices = [idx for idx, text in enumerate(parts) if len(text.strip()) > 0]
+        translations = self._translate_texts(
+            source_language, target_language, [parts[idx] for idx in indices], cache
+        )
+        translated_parts = [""] * len(parts)
+        for idx, translation in zip(indices, translations):
+            translated_parts[idx] = translation
 
         translation = _BREAK_MARKER.join(translated_parts)
         logger().debug(f"translation.translate_script. Translation: {translation}")
@@ -31,6 +31,9 @@ class TranslationApertium(Translation):
 
         self.server = server
 
+    def _get_cache_id(self) -> str:
+        return f"{super()._get_cache_id()}:{self.server}"
+
     def _do_api_call(self, url):
         max_retries = 3
         for attempt in range(1, max_retries + 1):
@@ -20,18 +20,17 @@ from open_dubbing.translation import Translation
 
 class TranslationNLLB(Translation):
 
-    def __init__(self, device="cpu"):
-        super().__init__(device)
+    def __init__(self, device="cpu", batch_size=16):
+        super().__init__(device, batch_size)
         self.translator = None
         self.translator_languages = ""
+        self._language_pairs = None
 
     def load_model(self, name="nllb-200-1.3B"):
         self.model_name = f"facebook/{name}"
         self.tokenizer = self._get_tokenizer_nllb()
 
-    def _translate_text(
-        self, source_language: str, target_language: str, text: str
-    ) -> str:
+    def _get_translator(self, source_language: str, target_language: str):
         languages = f"{source_language}{target_language}"
         if not self.translator or self.translator_languages != languages:
             model = self._get_model_nllb()
@@ -45,9 +44,20 @@ class TranslationNLLB(Translation):
             )
             self.translator_languages = languages
 
-        translated = self.translator(text)
+        return self.translator
+
+    def _translate_text(
+        self, source_language: str, target_language: str, text: str
+    ) -> str:
+        translator = self._get_translator(source_language, target_language)
+        translated = translator(text)
         return translated[0]["translation_text"]
 
+    def _translate_batch(self, source_language, target_language, texts):
+        translator = self._get_translator(source_language, target_language)
+        translated = translator(list(texts), batch_size=len(texts))
+        return [item["translation_text"] for item in translated]
+
     def _get_tokenizer_nllb(self):
         return AutoTokenizer.from_pretrained(self.model_name)
 
@@ -66,9 +76,12 @@ class TranslationNLLB(Translation):
                 raise e
 
     def get_language_pairs(self):
-        tokenizer = self._get_tokenizer_nllb()
+        # Built once, NLLB supports ~200 languages (~40k pairs)
+        if self._language_pairs is not None:
+            return self._language_pairs
+
         # Returns 'cat_Latn'
-        original_list = tokenizer.additional_special_tokens
+        original_list = self.tokenizer.additional_special_tokens
         # Get only the language codes
         supported_languages = [s[:3] for s in original_list]
         pairs = set()
@@ -80,11 +93,11 @@ class TranslationNLLB(Translation):
                 pair = (source, target)
                 pairs.add(pair)
 
-        return pairs
+        self._language_pairs = frozenset(pairs)
+        return self._language_pairs
 
     def _get_nllb_language(self, source_language_iso_639_3: str) -> str:
-        tokenizer = self._get_tokenizer_nllb()
-        nllb_languages = tokenizer.additional_special_tokens
+        nllb_languages = self.tokenizer.additional_special_tokens
         for nllb_language in nllb_languages:
             if nllb_language[:3] == source_language_iso_639_3:
                 return nllb_language
@@ -0,0 +1,93 @@
+# Copyright 2024 Jordi Mas i Hernàndez <jmas@softcatala.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+
+import ctranslate2
+
+from open_dubbing import get_cache_directory, logger
+from open_dubbing.translation_nllb import TranslationNLLB
+
+
+class TranslationNLLBCT2(TranslationNLLB):
+
+    def __init__(self, device="cpu", compute_type="int8", cpu_threads=0, batch_size=16):
+        super().__init__(device, batch_size)
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+        self._ct2_translator = None
+
+    def _get_cache_id(self) -> str:
+        return f"{super()._get_cache_id()}:{self.compute_type}"
+
+    @staticmethod
+    def get_converted_model_dir(name: str, compute_type: str) -> str:
+        return os.path.join(get_cache_directory("ct2"), f"{name}-{compute_type}")
+
+    # The HF checkpoint is converted only the first time and reused afterwards
+    def _get_converted_model(self, name: str) -> str:
+        model_dir = self.get_converted_model_dir(name, self.compute_type)
+        if os.path.exists(model_dir):
+            return model_dir
+
+        logger().info(
+            f"Converting translation model {self.model_name} to CTranslate2 ({self.compute_type})"
+        )
+        tmp_dir = model_dir + ".tmp"
+        converter = ctranslate2.converters.TransformersConverter(self.model_name)
+        converter.convert(tmp_dir, quantization=self.compute_type, force=True)
+        shutil.move(tmp_dir, model_dir)
+        return model_dir
+
+    def load_model(self, name="nllb-200-1.3B"):
+        super().load_model(name)
+        model_dir = self._get_converted_model(name)
+        self._ct2_translator = ctranslate2.Translator(
+            model_dir,
+            device=self.device,
+            compute_type=self.compute_type,
+            intra_threads=self.cpu_threads,
+        )
+
+    def _translate_text(
+        self, source_language: str, target_language: str, text: str
+    ) -> str:
+        return self._translate_batch(source_language, target_language, [text])[0]
+
+    def _translate_batch(self, source_language, target_language, texts):
+        self.tokenizer.src_lang = self._get_nllb_language(source_language)
+        sources = [
+            self.tokenizer.convert_ids_to_tokens(self.tokenizer.encode(text))
+            for text in texts
+        ]
+        target_prefix = [self._get_nllb_language(target_language)]
+        results = self._ct2_translator.translate_batch(
+            sources,
+            target_prefix=[target_prefix] * len(sources),
+            # Greedy decoding as the Transformers pipeline, CTranslate2 defaults to 2 beams
+            beam_size=1,
+            max_batch_size=self.batch_size,
+            max_decoding_length=1024,
+        )
+        translations = []
+        for result in results:
+            target = result.hypotheses[0][1:]
+            translations.append(
+                self.tokenizer.decode(
+                    self.tokenizer.convert_tokens_to_ids(target),
+                    skip_special_tokens=True,
+                )
+            )
+        return translations
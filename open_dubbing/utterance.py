@@ -16,7 +16,6 @@ import dataclasses
 import hashlib
 import json
 import os
-import shutil
 import tempfile
 
 from typing import Any, Dict, Final, List, Tuple
@@ -85,16 +84,19 @@ class Utterance:
                 )
             all_data["metadata"] = metadata
 
-            json_data = json.dumps(all_data, ensure_ascii=False, indent=4)
+            # Written next to the final file, so it is renamed instead of copied and a
+            # crash while saving never leaves a truncated metadata file
             with tempfile.NamedTemporaryFile(
-                mode="w", delete=False, encoding="utf-8"
+                mode="w",
+                delete=False,
+                encoding="utf-8",
+                dir=self.output_directory,
+                suffix=".json",
             ) as temporary_file:
-
-                temporary_file.write(json_data)
+                json.dump(all_data, temporary_file, ensure_ascii=False, indent=4)
                 temporary_file.flush()
                 os.fsync(temporary_file.fileno())
-            shutil.copy(temporary_file.name, utterance_metadata_file)
-            os.remove(temporary_file.name)
+            os.replace(temporary_file.name, utterance_metadata_file)
             logger().debug(
                 "Utterance metadata saved successfully to"
                 f" '{utterance_metadata_file}'"
@@ -19,16 +19,40 @@ from typing import Final
 
 from moviepy import AudioFileClip, VideoFileClip, concatenate_videoclips
 
+from open_dubbing import logger
+from open_dubbing.ffmpeg import FFmpeg
+
 _DEFAULT_FPS: Final[int] = 30
 _DEFAULT_DUBBED_VIDEO_FILE: Final[str] = "dubbed_video"
 _DEFAULT_OUTPUT_FORMAT: Final[str] = ".mp4"
+# Video codecs that can be copied into an mp4 without re-encoding
+_MP4_VIDEO_CODECS: Final[frozenset[str]] = frozenset(
+    {"h264", "hevc", "mpeg4", "av1", "vp9"}
+)
+# Used when the video stream of the input cannot be copied into an mp4
+_FALLBACK_VIDEO_CODEC: Final[str] = "libx264"
 
 
 class VideoProcessing:
 
     @staticmethod
-    def split_audio_video(*, video_file: str, output_directory: str) -> tuple[str, str]:
-        """Splits an audio/video file into separate audio and video files."""
+    def split_audio_video(
+        *, video_file: str, output_directory: str, video_codec: str = "copy"
+    ) -> tuple[str, str]:
+        """Splits an audio/video file into separate audio and video files.
+
+        With video_codec 'copy' the video stream is copied without re-encoding,
+        unless the mp4 container does not support its codec (e.g. VP8 or ProRes
+        in mkv and mov files), then it is encoded with libx264.
+        """
+
+        if video_codec == "copy":
+            codec = FFmpeg().get_video_codec(video_file)
+            if codec not in _MP4_VIDEO_CODECS:
+                logger().info(
+                    f"Video codec '{codec}' cannot be copied into an mp4, encoding the video with '{_FALLBACK_VIDEO_CODEC}'"
+                )
+                video_codec = _FALLBACK_VIDEO_CODEC
 
         base_filename = os.path.basename(video_file)
         filename, _ = os.path.splitext(base_filename)
@@ -37,13 +61,16 @@ class VideoProcessing:
             audio_clip = video_clip.audio
             audio_output_file = os.path.join(output_directory, filename + "_audio.mp3")
             audio_clip.write_audiofile(audio_output_file, logger=None)
-            video_clip_without_audio = video_clip.with_audio(None)
-            fps = video_clip.fps or _DEFAULT_FPS
 
             video_output_file = os.path.join(output_directory, filename + "_video.mp4")
-            video_clip_without_audio.write_videofile(
-                video_output_file, codec="libx264", fps=fps, logger=None
-            )
+            if video_codec == "copy":
+                FFmpeg().remove_audio(source=video_file, target=video_output_file)
+            else:
+                video_clip_without_audio = video_clip.with_audio(None)
+                fps = video_clip.fps or _DEFAULT_FPS
+                video_clip_without_audio.write_videofile(
+                    video_output_file, codec=video_codec, fps=fps, logger=None
+                )
         return video_output_file, audio_output_file
 
     @staticmethod
@@ -53,13 +80,31 @@ class VideoProcessing:
         dubbed_audio_file: str,
         output_directory: str,
         target_language: str,
+        video_codec: str = "copy",
     ) -> str:
         """Combines an audio file with a video file, ensuring they have the same duration.
 
+        With video_codec 'copy' the video stream is copied without re-encoding.
+
         Returns:
           The path to the output video file with dubbed audio.
         """
 
+        target_language_suffix = "_" + target_language.replace("-", "_").lower()
+        dubbed_video_file = os.path.join(
+            output_directory,
+            _DEFAULT_DUBBED_VIDEO_FILE
+            + target_language_suffix
+            + _DEFAULT_OUTPUT_FORMAT,
+        )
+        if video_codec == "copy":
+            FFmpeg().replace_audio(
+                video_file=video_file,
+                audio_file=dubbed_audio_file,
+                target=dubbed_video_file,
+            )
+            return dubbed_video_file
+
         video = VideoFileClip(video_file)
         audio = AudioFileClip(dubbed_audio_file)
         duration_difference = video.duration - audio.duration
@@ -71,16 +116,9 @@ class VideoProcessing:
         elif duration_difference < 0:
             audio = audio.subclipped(0, video.duration)
         final_clip = video.with_audio(audio)
-        target_language_suffix = "_" + target_language.replace("-", "_").lower()
-        dubbed_video_file = os.path.join(
-            output_directory,
-            _DEFAULT_DUBBED_VIDEO_FILE
-            + target_language_suffix
-            + _DEFAULT_OUTPUT_FORMAT,
-        )
         final_clip.write_videofile(
             dubbed_video_file,
-            codec="libx264",
+            codec=video_codec,
             audio_codec="aac",
             temp_audiofile="temp-audio.m4a",
             remove_temp=True,
@@ -130,10 +130,13 @@ class VoiceGenderClassifier:
         y = self.processor(x, sampling_rate=sampling_rate)
         y = y["input_values"][0]
         y = y.reshape(1, -1)
-        y = torch.from_numpy(y).to(self.device)
+        y = torch.from_numpy(y)
+        if self.device.startswith("cuda"):
+            y = y.pin_memory()
+        y = y.to(self.device, non_blocking=True)
 
         # Run through model
-        with torch.no_grad():
+        with torch.inference_mode():
             y = self.model(y)
             logits_age, logits_gender = y[1], y[2]  # Age and gender logits
             return logits_age, logits_gender
@@ -44,6 +44,8 @@ setup(
         "dev": ["flake8==7.*", "black==24.*", "pytest==8.*", "isort==5.13"],
         "coqui": ["coqui-tts >= 0.25.1"],
         "openai": ["openai == 1.59.3"],
+        "onnx": ["optimum[onnxruntime] >= 1.22.0", "onnxruntime >= 1.18.0"],
+        "webrtc": ["webrtcvad-wheels >= 2.0.14"],
     },
     entry_points={
         "console_scripts": [
@@ -17,10 +17,11 @@
 import os
 import tempfile
 
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 import numpy as np
 import pytest
+import torch
 
 from moviepy.audio.AudioClip import AudioArrayClip
 from pyannote.audio import Pipeline
@@ -49,6 +50,66 @@ class TestAudioProcessing:
             )
             assert timestamps == [{"start": 0.0, "end": 10, "speaker_id": "SPEAKER_00"}]
 
+    @patch("torch.cuda.get_device_capability", return_value=(8, 6))
+    def test_create_timestamps_float16_autocast(self, _):
+        with tempfile.NamedTemporaryFile(suffix=".wav") as temporary_file:
+            silence = AudioArrayClip(np.zeros((44100, 2), dtype=np.int16), fps=44100)
+            silence.write_audiofile(temporary_file.name)
+
+            with patch("torch.autocast") as mock_autocast:
+                audio_processing.create_pyannote_timestamps(
+                    audio_file=temporary_file.name,
+                    pipeline=MagicMock(spec=Pipeline),
+                    device="cuda",
+                )
+
+        # bfloat16 embeddings cannot be converted to numpy by pyannote
+        mock_autocast.assert_called_once_with(device_type="cuda", dtype=torch.float16)
+
+    @pytest.mark.skipif(not torch.cuda.is_available(), reason="Requires CUDA")
+    def test_create_timestamps_autocast(self):
+        with tempfile.NamedTemporaryFile(suffix=".wav") as temporary_file:
+            silence = AudioArrayClip(np.zeros((44100, 2), dtype=np.int16), fps=44100)
+            silence.write_audiofile(temporary_file.name)
+            linear = torch.nn.Linear(4, 2).to("cuda")
+
+            # As pyannote's embedding wrapper does with the embedding model output
+            def _pipeline(_):
+                embeddings = linear(torch.ones((1, 4), device="cuda"))
+                embeddings.cpu().numpy()
+                return MagicMock(itertracks=MagicMock(return_value=[]))
+
+            timestamps = audio_processing.create_pyannote_timestamps(
+                audio_file=temporary_file.name,
+                pipeline=MagicMock(side_effect=_pipeline),
+                device="cuda",
+            )
+            assert timestamps == []
+
+    def test_active_speakers_embedding(self):
+        embedding = MagicMock(dimension=2, return_value=np.ones((1, 2)))
+        waveforms = torch.zeros((2, 1, 16000))
+        masks = torch.tensor([[0.0, 1.0], [0.0, 0.0]])
+
+        embeddings = audio_processing._ActiveSpeakersEmbedding(embedding)(
+            waveforms, masks=masks
+        )
+
+        _, kwargs = embedding.call_args
+        assert kwargs["masks"].shape == (1, 2)
+        assert np.array_equal(embeddings[0], [1.0, 1.0])
+        assert np.isnan(embeddings[1]).all()
+
+    def test_cluster_speakers(self):
+        embeddings = np.array([[1.0, 0.0], [0.0, 1.0], [0.99, 0.01], [0.01, 0.99]])
+        labels = audio_processing._cluster_speakers(embeddings)
+        assert labels[0] == labels[2]
+        assert labels[1] == labels[3]
+        assert labels[0] != labels[1]
+
+    def test_cluster_speakers_single(self):
+        assert audio_processing._cluster_speakers(np.array([[1.0, 0.0]])) == [0]
+
     def test_cut_and_save_audio_no_clone(self):
         with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as temporary_file:
             silence_duration = 10
@@ -0,0 +1,81 @@
+# Copyright 2024 Jordi Mas i Hernàndez <jmas@softcatala.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import tempfile
+
+from open_dubbing.cache import Cache, get_file_hash
+
+
+class TestCache:
+
+    def test_set_get_persists(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = Cache(directory)
+            cache.set("language", "eng")
+            cache.set_many({"a": "1", "b": "2"})
+            cache.close()
+
+            cache = Cache(directory)
+            assert cache.get("language") == "eng"
+            assert cache.get("b") == "2"
+            assert cache.get("missing") is None
+            cache.close()
+
+    def test_get_or_compute(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = Cache(directory)
+            calls = []
+
+            def _compute():
+                calls.append(1)
+                return "cat"
+
+            assert cache.get_or_compute("language", _compute) == "cat"
+            assert cache.get_or_compute("language", _compute) == "cat"
+            assert len(calls) == 1
+            cache.close()
+
+    def test_get_file_hash(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "file.mp4")
+            with open(path, "wb") as _file:
+                _file.write(b"video")
+            first = get_file_hash(path)
+
+            with open(path, "ab") as _file:
+                _file.write(b"more")
+            assert get_file_hash(path) != first
+
+    def test_get_file_hash_whole_content(self):
+        with tempfile.TemporaryDirectory() as directory:
+            first_path = os.path.join(directory, "first.mp4")
+            second_path = os.path.join(directory, "second.mp4")
+            data = bytearray(17 * 1024 * 1024)
+            with open(first_path, "wb") as _file:
+                _file.write(data)
+            data[-1] = 1
+            with open(second_path, "wb") as _file:
+                _file.write(data)
+
+            assert get_file_hash(first_path) != get_file_hash(second_path)
+
+    def test_context_manager_closes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with Cache(directory) as cache:
+                cache.set("language", "eng")
+
+            with Cache(directory) as cache:
+                assert cache.get("language") == "eng"
@@ -53,3 +53,94 @@ class TestCommandLine:
         ), pytest.raises(SystemExit):
             CommandLine.read_parameters()
             assert False  # should not arrive here
+
+    def test_argv(self):
+        args = CommandLine.read_parameters(
+            ["--input_file", "video.mp4", "--target_language", "cat"]
+        )
+
+        assert args.input_file == "video.mp4"
+        assert args.target_language == "cat"
+
+    def test_compute_type(self):
+        argv = ["--input_file", "video.mp4", "--target_language", "cat"]
+        args = CommandLine.read_parameters(argv)
+        assert args.compute_type is None
+
+        args = CommandLine.read_parameters(argv + ["--compute_type", "float32"])
+        assert args.compute_type == "float32"
+
+    def test_vad_method(self):
+        argv = ["--input_file", "video.mp4", "--target_language", "cat"]
+        args = CommandLine.read_parameters(argv)
+        assert args.vad_method is None
+
+        args = CommandLine.read_parameters(argv + ["--vad_method", "webrtc"])
+        assert args.vad_method == "webrtc"
+
+    def test_device_map(self):
+        argv = ["--input_file", "video.mp4", "--target_language", "cat"]
+        args = CommandLine.read_parameters(argv)
+        assert args.device_map == {}
+
+        args = CommandLine.read_parameters(
+            argv + ["--device_map", "demucs=cuda:1,tts=cuda:1"]
+        )
+        assert args.device_map == {"demucs": "cuda:1", "tts": "cuda:1"}
+
+    def test_device_map_invalid(self):
+        argv = ["--input_file", "video.mp4", "--target_language", "cat"]
+        with pytest.raises(SystemExit):
+            CommandLine.read_parameters(argv + ["--device_map", "stt=cuda:1"])
+
+    @pytest.mark.parametrize(
+        "option", ["--stt_batch_size", "--translation_batch_size", "--tts_concurrency"]
+    )
+    def test_positive_int_options(self, option):
+        argv = ["--input_file", "video.mp4", "--target_language", "cat"]
+        assert (
+            getattr(CommandLine.read_parameters(argv + [option, "2"]), option[2:]) == 2
+        )
+
+        for value in ["0", "-1", "two"]:
+            with pytest.raises(SystemExit):
+                CommandLine.read_parameters(argv + [option, value])
+
+    def test_diarization(self):
+        argv = ["--input_file", "video.mp4", "--target_language", "cat"]
+        args = CommandLine.read_parameters(argv)
+        assert args.diarization == "pyannote"
+
+        args = CommandLine.read_parameters(argv + ["--diarization", "vad"])
+        assert args.diarization == "vad"
+
+    def test_quantize_diarization(self):
+        argv = ["--input_file", "video.mp4", "--target_language", "cat"]
+        assert not CommandLine.read_parameters(argv).quantize_diarization
+
+        args = CommandLine.read_parameters(argv + ["--quantize_diarization"])
+        assert args.quantize_diarization
+
+    def test_sequential_preprocessing(self):
+        argv = ["--input_file", "video.mp4", "--target_language", "cat"]
+        assert not CommandLine.read_parameters(argv).sequential_preprocessing
+
+        args = CommandLine.read_parameters(argv + ["--sequential_preprocessing"])
+        assert args.sequential_preprocessing
+
+    def test_device_auto(self):
+        argv = ["--input_file", "video.mp4", "--target_language", "cat"]
+        args = CommandLine.read_parameters(argv + ["--device", "auto"])
+        assert args.device == "auto"
+
+    def test_resume(self):
+        argv = ["--input_file", "video.mp4", "--target_language", "cat"]
+        assert not CommandLine.read_parameters(argv).resume
+        assert CommandLine.read_parameters(argv + ["--resume"]).resume
+
+    def test_tts_stream(self):
+        argv = ["--input_file", "video.mp4", "--target_language", "cat"]
+        assert not CommandLine.read_parameters(argv).tts_stream
+
+        args = CommandLine.read_parameters(argv + ["--tts_stream"])
+        assert args.tts_stream
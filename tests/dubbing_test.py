@@ -12,15 +12,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import errno
 import os
 import tempfile
+import threading
 
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 import pytest
 
 from open_dubbing import dubbing
 from open_dubbing.dubbing import Dubber
+from open_dubbing.preprocessing import PreprocessingArtifacts
 from open_dubbing.utterance import Utterance
 
 
@@ -44,6 +47,7 @@ class TestDubbing:
             ),
             ("Test-File-2024-with-Hyphens.mov", "testfile2024withhyphens.mov"),
             ("lowercasefilename.avi", "lowercasefilename.avi"),
+            ("Càrrega d'àudio.mp4", "crregadudio.mp4"),
         ],
     )
     def test_rename(self, original_file, expected_result):
@@ -71,6 +75,66 @@ class TestDubbing:
         dubbing.overwrite_input_file(original_full_path, expected_full_path)
         assert os.path.exists(expected_full_path)
 
+    def test_overwrite_input_file_other_file_system(self):
+        original_full_path = os.path.join(self.temp_dir, "Video.mp4")
+        expected_full_path = os.path.join(self.temp_dir, "video.mp4")
+
+        with patch(
+            "os.replace", side_effect=OSError(errno.EXDEV, "Cross-device link")
+        ), patch("shutil.move") as mock_move:
+            with open(original_full_path, "w") as f:
+                f.write("Test content")
+
+            dubbing.overwrite_input_file(original_full_path, expected_full_path)
+
+        mock_move.assert_called_once_with(original_full_path, expected_full_path)
+
+    def test_resume(self):
+        with tempfile.TemporaryDirectory() as directory:
+            audio_file = os.path.join(directory, "audio.mp3")
+            chunk_file = os.path.join(directory, "chunk.mp3")
+            for path in [audio_file, chunk_file]:
+                open(path, "w").close()
+
+            def _get_dubber():
+                return Dubber(
+                    input_file="video.mp4",
+                    output_directory=directory,
+                    source_language="eng",
+                    target_language="cat",
+                    target_language_region="",
+                    tts=None,
+                    translation=None,
+                    stt=None,
+                    device="cpu",
+                    resume_dir=os.path.join(directory, ".stages", "run"),
+                )
+
+            dubber = _get_dubber()
+            assert dubber._resume() == 0
+            dubber.preprocessing_output = PreprocessingArtifacts(
+                video_file=None, audio_file=audio_file
+            )
+            dubber.utterance_metadata = [{"path": chunk_file, "text": "Hello"}]
+            dubber._save_stage("preprocessing")
+            dubber.utterance_metadata[0]["translated_text"] = "Hola"
+            dubber._save_stage("stt")
+
+            dubber = _get_dubber()
+            assert dubber._resume() == 2
+            assert dubber.utterance_metadata[0]["translated_text"] == "Hola"
+            assert dubber.preprocessing_output.audio_file == audio_file
+
+            # Removed when the run completes
+            dubber._remove_stages()
+            assert not os.path.exists(os.path.join(directory, ".stages"))
+            assert _get_dubber()._resume() == 0
+
+            # The intermediate files were cleaned, the stages run again
+            dubber._save_stage("stt")
+            os.remove(chunk_file)
+            assert _get_dubber()._resume() == 0
+
     def _setup_temp_files_for_cleaning(self):
         paths = [os.path.join(self.temp_dir, "test_path_1.mp3")]
         dubbed_paths = [os.path.join(self.temp_dir, "dubbed_path_1.mp3")]
@@ -134,3 +198,107 @@ class TestDubbing:
             obj.run_cleaning()
             for path in paths + dubbed_paths + [dubbed_audio_path, dubbed_vocals_path]:
                 assert os.path.exists(path), f"File {path} was deleted"
+
+    def test_run_preprocessing_overlaps_demucs_and_diarization(self):
+        diarization_started = threading.Event()
+
+        # Demucs only finishes once the diarization has started, which would
+        # time out if both were run one after the other
+        def _execute_demucs_command(*, command):
+            assert diarization_started.wait(timeout=5)
+
+        def _create_pyannote_timestamps(**kwargs):
+            diarization_started.set()
+            return [{"start": 0.0, "end": 1.0, "speaker_id": "SPEAKER_00"}]
+
+        with patch.object(Dubber, "input_file", "video.mp4"), patch.object(
+            Dubber, "pyannote_pipeline", None
+        ), patch(
+            "open_dubbing.dubbing.VideoProcessing.split_audio_video",
+            return_value=("video.mp4", "audio.mp3"),
+        ), patch(
+            "open_dubbing.dubbing.Demucs.execute_demucs_command",
+            side_effect=_execute_demucs_command,
+        ), patch(
+            "open_dubbing.audio_processing.create_pyannote_timestamps",
+            side_effect=_create_pyannote_timestamps,
+        ), patch(
+            "open_dubbing.audio_processing.run_cut_and_save_audio",
+            side_effect=lambda **kwargs: kwargs["utterance_metadata"],
+        ):
+            obj = Dubber(
+                input_file="video.mp4",
+                output_directory=self.temp_dir,
+                source_language="eng",
+                target_language="cat",
+                target_language_region="",
+                hugging_face_token="",
+                tts=None,
+                translation=None,
+                stt=None,
+                device="cpu",
+            )
+            obj.run_preprocessing()
+
+        assert obj.utterance_metadata[0]["speaker_id"] == "SPEAKER_00"
+        assert obj.preprocessing_output.audio_file == "audio.mp3"
+
+    def test_run_preprocessing_sequential(self):
+        demucs_finished = threading.Event()
+
+        def _create_pyannote_timestamps(**kwargs):
+            assert demucs_finished.is_set()
+            return [{"start": 0.0, "end": 1.0, "speaker_id": "SPEAKER_00"}]
+
+        with patch.object(Dubber, "input_file", "video.mp4"), patch.object(
+            Dubber, "pyannote_pipeline", None
+        ), patch(
+            "open_dubbing.dubbing.VideoProcessing.split_audio_video",
+            return_value=("video.mp4", "audio.mp3"),
+        ), patch(
+            "open_dubbing.dubbing.Demucs.execute_demucs_command",
+            side_effect=lambda **kwargs: demucs_finished.set(),
+        ), patch(
+            "open_dubbing.audio_processing.create_pyannote_timestamps",
+            side_effect=_create_pyannote_timestamps,
+        ), patch(
+            "open_dubbing.audio_processing.run_cut_and_save_audio",
+            side_effect=lambda **kwargs: kwargs["utterance_metadata"],
+        ):
+            obj = Dubber(
+                input_file="video.mp4",
+                output_directory=self.temp_dir,
+                source_language="eng",
+                target_language="cat",
+                target_language_region="",
+                hugging_face_token="",
+                tts=None,
+                translation=None,
+                stt=None,
+                device="cpu",
+                sequential_preprocessing=True,
+            )
+            obj.run_preprocessing()
+
+        assert obj.utterance_metadata[0]["speaker_id"] == "SPEAKER_00"
+
+    def test_warmup_models(self):
+        stt, tts = MagicMock(), MagicMock()
+        tts.warmup.side_effect = RuntimeError("No model")
+        obj = Dubber(
+            input_file="video.mp4",
+            output_directory=self.temp_dir,
+            source_language="eng",
+            target_language="cat",
+            target_language_region="",
+            hugging_face_token="",
+            tts=tts,
+            translation=None,
+            stt=stt,
+            device="cpu",
+        )
+
+        obj._warmup_models()
+
+        stt.warmup.assert_called_once_with()
+        tts.warmup.assert_called_once_with(target_language="cat")
@@ -18,7 +18,7 @@ import tempfile
 
 from unittest.mock import MagicMock, patch
 
-from open_dubbing.ffmpeg import FFmpeg
+from open_dubbing.ffmpeg import FFmpeg, _get_binary
 
 
 class TestFFmpeg:
@@ -81,6 +81,18 @@ class TestFFmpeg:
         expected = self._get_srt()
         assert subtitles == expected
 
+    @patch("shutil.which")
+    def test_get_binary(self, mock_which):
+        _get_binary.cache_clear()
+        mock_which.return_value = "/usr/bin/ffmpeg"
+        assert _get_binary("ffmpeg") == "/usr/bin/ffmpeg"
+        assert _get_binary("ffmpeg") == "/usr/bin/ffmpeg"
+        mock_which.assert_called_once_with("ffmpeg")
+
+        mock_which.return_value = None
+        assert _get_binary("ffprobe") == "ffprobe"
+        _get_binary.cache_clear()
+
     @patch("subprocess.run")
     def test_is_ffmpeg_installed(self, mock_subprocess):
         # Test when ffmpeg is installed
@@ -96,3 +108,95 @@ class TestFFmpeg:
     def test_is_ffmpeg_exe_error(self, mock_subprocess):
         mock_subprocess.return_value = MagicMock(returncode=1)
         assert not FFmpeg.is_ffmpeg_installed()
+
+    @patch("subprocess.run")
+    def test_get_video_codec(self, mock_subprocess):
+        mock_subprocess.return_value = MagicMock(returncode=0, stdout="vp8\n")
+        assert FFmpeg().get_video_codec("video.mkv") == "vp8"
+
+        mock_subprocess.return_value = MagicMock(returncode=1, stdout="")
+        assert FFmpeg().get_video_codec("video.mkv") is None
+
+    @patch("subprocess.run")
+    def test_replace_audio_copies_video(self, mock_subprocess):
+        mock_subprocess.return_value = MagicMock(returncode=0)
+        FFmpeg().replace_audio(
+            video_file="video.mp4", audio_file="audio.mp3", target="dubbed.mp4"
+        )
+
+        cmd = mock_subprocess.call_args[0][0]
+        assert cmd[cmd.index("-c:v") + 1] == "copy"
+        assert "-shortest" in cmd
+        assert cmd[-1] == "dubbed.mp4"
+
+    @patch("os.cpu_count", return_value=1)
+    @patch("subprocess.run")
+    def test_batch_adjust_audio_speed(self, mock_subprocess, mock_cpu_count):
+        def _run(cmd, **kwargs):
+            outputs = [cmd[idx + 2] for idx, arg in enumerate(cmd) if arg == "-map"]
+            for output in outputs:
+                with open(output, "w") as _file:
+                    _file.write("faster")
+            return MagicMock(returncode=0)
+
+        mock_subprocess.side_effect = _run
+        with tempfile.TemporaryDirectory() as directory:
+            filenames = [os.path.join(directory, f"{name}.mp3") for name in "ab"]
+            for filename in filenames:
+                with open(filename, "w") as original:
+                    original.write("original")
+
+            FFmpeg().batch_adjust_audio_speed(list(zip(filenames, [1.1, 1.3])))
+
+            mock_subprocess.assert_called_once()
+            cmd = mock_subprocess.call_args[0][0]
+            assert (
+                cmd[cmd.index("-filter_complex") + 1]
+                == "[0:a]atempo=1.1[a0];[1:a]atempo=1.3[a1]"
+            )
+            for filename in filenames:
+                with open(filename) as dubbed:
+                    assert dubbed.read() == "faster"
+            assert sorted(os.listdir(directory)) == ["a.mp3", "b.mp3"]
+
+    @patch("subprocess.run")
+    def test_adjust_audio_speed_replaces_file(self, mock_subprocess):
+        def _run(cmd, **kwargs):
+            with open(cmd[-1], "w") as output:
+                output.write("faster")
+            return MagicMock(returncode=0)
+
+        mock_subprocess.side_effect = _run
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "dubbed.mp3")
+            with open(filename, "w") as original:
+                original.write("original")
+
+            FFmpeg().adjust_audio_speed(filename=filename, speed=1.2)
+
+            cmd = mock_subprocess.call_args[0][0]
+            assert cmd[cmd.index("-i") + 1] == filename
+            assert cmd[-1].endswith(".mp3")
+            with open(filename) as dubbed:
+                assert dubbed.read() == "faster"
+            assert os.listdir(directory) == ["dubbed.mp3"]
+
+    @patch("subprocess.run")
+    def test_embed_subtitles_keeps_video_on_error(self, mock_subprocess):
+        mock_subprocess.return_value = MagicMock(returncode=1, stderr=b"error")
+        with tempfile.TemporaryDirectory() as directory:
+            video_file = os.path.join(directory, "dubbed.mp4")
+            with open(video_file, "w") as video:
+                video.write("video")
+
+            FFmpeg().embed_subtitles(
+                video_file=video_file,
+                subtitles_files=["dubbed.srt"],
+                languages_iso_639_3=["cat"],
+            )
+
+            cmd = mock_subprocess.call_args[0][0]
+            assert cmd[cmd.index("-i") + 1] == video_file
+            with open(video_file) as video:
+                assert video.read() == "video"
+            assert os.listdir(directory) == ["dubbed.mp4"]
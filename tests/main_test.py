@@ -13,20 +13,53 @@
 # limitations under the License.
 
 import os
+import subprocess
+import sys
+import tempfile
 
 from unittest.mock import patch
 
 import pytest
 
 from open_dubbing.main import (
+    _check_compute_type,
     _get_openai_key,
     _get_selected_translator,
     _get_selected_tts,
+    _get_source_language_from_metadata,
+    _get_vad_method,
+    _resolve_device,
+    _set_cpu_threads,
+    _set_model_cache_dir,
+    check_is_a_video,
 )
+from open_dubbing.preprocessing import PreprocessingArtifacts
+from open_dubbing.utterance import Utterance
 
 
 class TestMain:
 
+    @pytest.mark.parametrize(
+        "input_file", ["video.mp4", "Video.MKV", "dir.d/video.mov"]
+    )
+    def test_check_is_a_video(self, input_file):
+        check_is_a_video(input_file)
+
+    def test_check_is_a_video_unsupported(self):
+        with pytest.raises(SystemExit) as excinfo:
+            check_is_a_video("audio.mp3")
+
+        assert excinfo.value.code == 103
+
+    def test_resolve_device(self):
+        assert _resolve_device("cuda") == "cuda"
+
+        with patch("torch.cuda.is_available", return_value=False):
+            assert _resolve_device("auto") == "cpu"
+
+        with patch("torch.cuda.is_available", return_value=True):
+            assert _resolve_device("auto") == "cuda"
+
     def test_get_selected_tts_mss(self):
         tts = _get_selected_tts("mms", "", "", "cpu", None)
         assert "TextToSpeechMMS" == type(tts).__name__
@@ -51,6 +84,14 @@ class TestMain:
     def test_get_selected_tts_api(self):
         tts = _get_selected_tts("api", "", "http://tts-server.com", "cpu", None)
         assert "TextToSpeechAPI" == type(tts).__name__
+        assert not tts.streaming
+
+    def test_get_selected_tts_stream(self):
+        tts = _get_selected_tts("api", "", "http://tts-server.com", "cpu", None, True)
+        assert tts.streaming
+
+        tts = _get_selected_tts("edge", "", "", "cpu", None, True)
+        assert not tts.streaming
 
     def test_get_selected_tts_api_no_server(self):
         with pytest.raises(SystemExit) as excinfo:
@@ -89,3 +130,91 @@ class TestMain:
 
         assert excinfo.type is SystemExit
         assert excinfo.value.code == 113
+
+    def test_set_model_cache_dir(self):
+        with patch.dict(os.environ, {}):
+            _set_model_cache_dir("/tmp/models")
+            assert os.environ["HF_HOME"] == "/tmp/models/huggingface"
+            assert os.environ["XDG_CACHE_HOME"] == "/tmp/models"
+
+    def test_import_does_not_load_models_libraries(self):
+        code = (
+            "import sys, open_dubbing.main; "
+            "print([m for m in ('torch', 'transformers', 'ctranslate2', "
+            "'faster_whisper', 'pyannote') if m in sys.modules])"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+        assert result.stdout.strip() == "[]"
+
+    def test_get_selected_translator_nllb_does_not_load_ctranslate2(self):
+        code = (
+            "import sys\n"
+            "from unittest.mock import patch\n"
+            "from open_dubbing.main import _get_selected_translator\n"
+            "with patch('open_dubbing.translation_nllb.TranslationNLLB.load_model'):\n"
+            "    _get_selected_translator('nllb', 'nllb-200-1.3B', '', 'cpu')\n"
+            "print([m for m in ('ctranslate2', 'open_dubbing.translation_nllb_ct2') "
+            "if m in sys.modules])"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+        assert result.stdout.strip() == "[]"
+
+    def test_init_logging_does_not_load_transformers(self):
+        code = (
+            "import sys, open_dubbing.main; "
+            "open_dubbing.main._init_logging('ERROR'); "
+            "print([m for m in ('transformers', 'edge_tts', "
+            "'open_dubbing.translation_apertium') if m in sys.modules])"
+        )
+        # The log file is created in the working directory
+        with tempfile.TemporaryDirectory() as directory:
+            result = subprocess.run(
+                [sys.executable, "-c", code],
+                capture_output=True,
+                text=True,
+                check=True,
+                cwd=directory,
+                env={**os.environ, "PYTHONPATH": os.getcwd()},
+            )
+        assert result.stdout.strip() == "[]"
+
+    def test_get_vad_method(self):
+        assert _get_vad_method(None, False) == "off"
+        assert _get_vad_method(None, True) == "silero"
+        assert _get_vad_method("silero", False) == "silero"
+
+    def test_set_cpu_threads(self):
+        with patch.dict(os.environ, {}):
+            _set_cpu_threads(4)
+            assert os.environ["OMP_NUM_THREADS"] == "4"
+            assert os.environ["MKL_NUM_THREADS"] == "4"
+
+    def test_get_source_language_from_metadata(self):
+        with tempfile.TemporaryDirectory() as directory:
+            Utterance("cat", directory).save_utterances(
+                utterance_metadata=[],
+                preprocessing_output=PreprocessingArtifacts(
+                    video_file="video.mp4", audio_file="audio.mp3"
+                ),
+                metadata={"source_language": "eng"},
+            )
+            assert _get_source_language_from_metadata("cat", directory) == "eng"
+            with pytest.raises(SystemExit) as excinfo:
+                _get_source_language_from_metadata("spa", directory)
+            assert excinfo.value.code == 111
+
+    def test_check_compute_type_not_supported(self):
+        with patch(
+            "ctranslate2.get_supported_compute_types",
+            return_value={"int8", "int8_float32", "float32"},
+        ), patch("open_dubbing.main.logger") as mock_logger:
+            _check_compute_type("float16", "cpu")
+            mock_logger().warning.assert_called_once()
+
+            mock_logger.reset_mock()
+            _check_compute_type("int8", "cpu")
+            mock_logger().warning.assert_not_called()
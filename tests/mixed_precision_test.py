@@ -0,0 +1,55 @@
+# Copyright 2024 Jordi Mas i Hernàndez <jmas@softcatala.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest.mock import patch
+
+import torch
+
+from open_dubbing.mixed_precision import autocast, enable_tf32, get_half_precision_dtype
+
+
+class TestMixedPrecision:
+
+    def test_get_half_precision_dtype_cpu(self):
+        assert get_half_precision_dtype("cpu") is None
+
+    @patch("torch.cuda.get_device_capability", return_value=(8, 6))
+    def test_get_half_precision_dtype_ampere(self, _):
+        assert get_half_precision_dtype("cuda") == torch.bfloat16
+
+    @patch("torch.cuda.get_device_capability", return_value=(7, 5))
+    def test_get_half_precision_dtype_turing(self, _):
+        assert get_half_precision_dtype("cuda:1") == torch.float16
+
+    def test_autocast_cpu(self):
+        with autocast("cpu", torch.float16):
+            assert not torch.is_autocast_enabled()
+
+    @patch("torch.cuda.get_device_capability", return_value=(8, 6))
+    def test_autocast_dtype(self, _):
+        with patch("torch.autocast") as mock_autocast:
+            autocast("cuda")
+            mock_autocast.assert_called_with(device_type="cuda", dtype=torch.bfloat16)
+
+            autocast("cuda", torch.float16)
+            mock_autocast.assert_called_with(device_type="cuda", dtype=torch.float16)
+
+    def test_enable_tf32(self):
+        precision = torch.get_float32_matmul_precision()
+        try:
+            enable_tf32()
+            assert torch.get_float32_matmul_precision() == "high"
+            assert torch.backends.cudnn.allow_tf32
+        finally:
+            torch.set_float32_matmul_precision(precision)
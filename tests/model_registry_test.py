@@ -0,0 +1,69 @@
+# Copyright 2024 Jordi Mas i Hernàndez <jmas@softcatala.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+from open_dubbing.model_registry import ModelRegistry
+
+
+class TestModelRegistry:
+
+    def setup_method(self):
+        ModelRegistry.clear()
+
+    def test_get_loads_once(self):
+        loader = MagicMock(return_value="model")
+
+        first = ModelRegistry.get("stt", ("medium", "cpu"), loader)
+        second = ModelRegistry.get("stt", ("medium", "cpu"), loader)
+
+        assert first == "model"
+        assert second == "model"
+        loader.assert_called_once()
+
+    def test_get_different_params(self):
+        ModelRegistry.get("stt", ("medium", "cpu"), lambda: "medium")
+        model = ModelRegistry.get("stt", ("large-v3", "cpu"), lambda: "large")
+        assert model == "large"
+
+    def test_get_does_not_keep_none(self):
+        loader = MagicMock(side_effect=[None, "pipeline"])
+
+        assert ModelRegistry.get("pyannote", ("3.1", "cpu"), loader) is None
+        assert ModelRegistry.get("pyannote", ("3.1", "cpu"), loader) == "pipeline"
+
+    def test_get_loads_different_models_at_the_same_time(self):
+        stt_loading = threading.Event()
+
+        # The translation model only loads once the speech to text one is
+        # loading, which would time out if the loads were serialized
+        def _load_stt():
+            stt_loading.set()
+            return "stt"
+
+        def _load_translation():
+            assert stt_loading.wait(timeout=5)
+            return "translation"
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            translation = executor.submit(
+                ModelRegistry.get, "translation", "nllb", _load_translation
+            )
+            stt = executor.submit(ModelRegistry.get, "stt", "medium", _load_stt)
+
+        assert translation.result() == "translation"
+        assert stt.result() == "stt"
@@ -0,0 +1,43 @@
+# Copyright 2024 Jordi Mas i Hernàndez <jmas@softcatala.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import tempfile
+
+from unittest.mock import patch
+
+import pytest
+
+from open_dubbing.prefetch import prefetch_directories
+
+
+@pytest.mark.skipif(
+    not hasattr(os, "posix_fadvise"), reason="posix_fadvise is not available"
+)
+class TestPrefetch:
+
+    def test_prefetch_directories(self):
+        with tempfile.TemporaryDirectory() as directory:
+            os.makedirs(os.path.join(directory, "sub"))
+            for name in ["model.bin", os.path.join("sub", "config.json")]:
+                with open(os.path.join(directory, name), "wb") as _file:
+                    _file.write(b"weights")
+
+            with patch("os.posix_fadvise") as mock_fadvise:
+                prefetch_directories([directory, os.path.join(directory, "missing")])
+
+        assert mock_fadvise.call_count == 2
+        for call in mock_fadvise.call_args_list:
+            assert call.args[1:] == (0, 0, os.POSIX_FADV_WILLNEED)
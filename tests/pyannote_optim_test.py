@@ -0,0 +1,49 @@
+# Copyright 2024 Jordi Mas i Hernàndez <jmas@softcatala.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from types import SimpleNamespace
+
+import torch
+
+from open_dubbing.pyannote_optim import quantize_embedding_model, quantize_model
+
+
+class TestPyannoteOptim:
+
+    def test_quantize_model(self):
+        model = torch.nn.Sequential(
+            torch.nn.Conv1d(1, 4, 3), torch.nn.Flatten(), torch.nn.Linear(8, 2)
+        )
+
+        quantized = quantize_model(model)
+
+        assert quantized is model
+        assert isinstance(model[0], torch.nn.Conv1d)
+        assert isinstance(model[2], torch.ao.nn.quantized.dynamic.Linear)
+        assert quantized(torch.zeros((1, 1, 4))).shape == (1, 2)
+
+    def test_quantize_embedding_model(self):
+        pipeline = SimpleNamespace(
+            _segmentation=SimpleNamespace(model=torch.nn.LSTM(4, 4)),
+            _embedding=SimpleNamespace(
+                model_=torch.nn.Sequential(torch.nn.Linear(4, 2))
+            ),
+        )
+
+        quantize_embedding_model(pipeline)
+
+        assert type(pipeline._segmentation.model) is torch.nn.LSTM
+        assert isinstance(
+            pipeline._embedding.model_[0], torch.ao.nn.quantized.dynamic.Linear
+        )
@@ -12,9 +12,26 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import array
+import io
 import os
+import pickle
+import subprocess
+import sys
+import wave
 
-from open_dubbing.pydub_audio_segment import AudioSegment
+from unittest.mock import patch
+
+from open_dubbing.pydub_audio_segment import (
+    AudioSegment,
+    _read_ahead,
+    _read_process_output,
+    fix_wav_headers,
+    get_extra_info,
+    lossless_bits_per_sample,
+    mediainfo_json_many,
+    read_wav_audio,
+)
 
 
 class TestPydubAudioSegment:
@@ -64,3 +81,180 @@ class TestPydubAudioSegment:
 
         samples = len(silent_seg)
         assert 1000 == samples
+
+    def test_24_bit_converted_to_32_bit(self):
+        data = bytes([0x01, 0x02, 0x03, 0xFF, 0xFF, 0xFF, 0x00, 0x00, 0x80])
+        audio_segment = AudioSegment(
+            data=data, sample_width=3, frame_rate=8000, channels=1
+        )
+
+        assert audio_segment.sample_width == 4
+        assert audio_segment.raw_data == bytes(
+            [0x00, 0x01, 0x02, 0x03, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0x00, 0x00, 0x80]
+        )
+
+    def test_from_mono_audiosegments(self):
+        left, right = [
+            AudioSegment(
+                data=array.array("h", samples).tobytes(),
+                sample_width=2,
+                frame_rate=8000,
+                channels=1,
+            )
+            for samples in [[1, 2, 3], [-1, -2, -3]]
+        ]
+
+        stereo = AudioSegment.from_mono_audiosegments(left, right)
+
+        assert stereo.channels == 2
+        assert stereo.get_array_of_samples().tolist() == [1, -1, 2, -2, 3, -3]
+
+    def test_fix_and_read_wav_headers(self):
+        wav = io.BytesIO()
+        with wave.open(wav, "wb") as wav_file:
+            wav_file.setnchannels(2)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(16000)
+            wav_file.writeframes(b"\x01\x00" * 8)
+        data = bytearray(wav.getvalue())
+        # ffmpeg writes unknown sizes when it outputs to a pipe
+        data[4:8] = b"\xff\xff\xff\xff"
+        data[40:44] = b"\xff\xff\xff\xff"
+
+        fix_wav_headers(data)
+        wav_data = read_wav_audio(bytes(data))
+
+        assert wav_data.channels == 2
+        assert wav_data.sample_rate == 16000
+        assert wav_data.bits_per_sample == 16
+        assert wav_data.raw_data == b"\x01\x00" * 8
+
+    def test_read_process_output(self):
+        code = (
+            "import sys; data = sys.stdin.buffer.read(); "
+            "sys.stdout.buffer.write(data * 3); sys.stderr.write('done')"
+        )
+        process = subprocess.Popen(
+            [sys.executable, "-c", code],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        data = os.urandom(1024 * 1024)
+
+        output, stderr = _read_process_output(process, data)
+
+        assert isinstance(output, bytearray)
+        assert output == data * 3
+        assert stderr == b"done"
+        assert process.returncode == 0
+
+    def test_get_extra_info(self):
+        stderr = (
+            "    Stream #0:0: Audio: flac, 88200 Hz, stereo, s32 (24 bit)\n"
+            "    Stream #0:1: Audio: vorbis\n"
+            "      44100 Hz, stereo, fltp, 320 kb/s\n"
+        )
+
+        assert get_extra_info(stderr) == {
+            0: ["Audio", "flac", "88200 Hz", "stereo", "s32 (24 bit)"],
+            1: ["Audio", "vorbis", "44100 Hz", "stereo", "fltp", "320 kb/s"],
+        }
+
+    def test_mediainfo_json_many(self):
+        with patch(
+            "open_dubbing.pydub_audio_segment.mediainfo_json",
+            side_effect=lambda filepath, read_ahead_limit: {"file": filepath},
+        ):
+            infos = mediainfo_json_many(["a.mp3", "b.mp3", "c.mp3"], max_workers=2)
+
+        assert infos == [{"file": "a.mp3"}, {"file": "b.mp3"}, {"file": "c.mp3"}]
+
+    def test_lossless_bits_per_sample(self, tmp_path):
+        wav = str(tmp_path / "audio.wav")
+        with wave.open(wav, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(3)
+            f.setframerate(8000)
+            f.writeframes(bytes(30))
+
+        streaminfo = bytes(10)
+        streaminfo += ((44100 << 44) | (1 << 41) | (23 << 36)).to_bytes(8, "big")
+        streaminfo += bytes(16)
+        flac = tmp_path / "audio.flac"
+        flac.write_bytes(b"fLaC" + bytes([0x80, 0, 0, 34]) + streaminfo)
+
+        assert lossless_bits_per_sample(wav, "wav") == 24
+        assert lossless_bits_per_sample(str(flac), "flac") == 32
+        assert lossless_bits_per_sample(wav, "flac") is None
+        assert lossless_bits_per_sample(str(tmp_path / "missing.wav"), "wav") is None
+
+    def test_init_reads_file_in_chunks(self):
+        wav = io.BytesIO()
+        with wave.open(wav, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(8000)
+            f.writeframes(bytes(range(200)))
+
+        class ChunkedReader(io.BytesIO):
+            def read(self, size=-1):
+                if size is None or size < 0:
+                    raise OSError("Too large to read at once")
+                return super().read(min(size, 64))
+
+        audio_segment = AudioSegment(data=ChunkedReader(wav.getvalue()))
+
+        assert audio_segment.raw_data == bytes(range(200))
+        assert audio_segment.frame_rate == 8000
+
+    def test_iter_ms(self):
+        data = bytes(range(252)) * 35
+        audio_segment = AudioSegment(
+            data=data, sample_width=2, frame_rate=44100, channels=1
+        )
+
+        chunks = list(audio_segment.iter_ms(step=10))
+        expected = [
+            audio_segment[i : min(i + 10, len(audio_segment))]
+            for i in range(0, len(audio_segment), 10)
+        ]
+
+        assert chunks == expected
+        assert b"".join(chunk.raw_data for chunk in chunks) == data
+        assert list(audio_segment) == [
+            audio_segment[i] for i in range(len(audio_segment))
+        ]
+
+    def test_getitem_fills_missing_frames_with_silence(self):
+        audio_segment = AudioSegment(
+            data=b"\x01\x02" * 12, sample_width=2, frame_rate=8000, channels=1
+        )
+
+        sliced = audio_segment[1:2]
+
+        assert sliced.raw_data == b"\x01\x02" * 4 + bytes(2 * 4)
+
+    def test_read_ahead(self, tmp_path):
+        path = tmp_path / "audio.mp3"
+        path.write_bytes(bytes(1024))
+
+        with patch("os.posix_fadvise", create=True) as posix_fadvise:
+            _read_ahead(str(path))
+            _read_ahead(str(tmp_path / "missing.mp3"))
+
+        assert posix_fadvise.call_count == 1
+
+    def test_slices_share_data_until_needed(self):
+        data = bytes(range(256)) * 16
+        audio_segment = AudioSegment(
+            data=data, sample_width=2, frame_rate=8000, channels=1
+        )
+
+        sliced = audio_segment[10:20][2:5]
+
+        assert isinstance(sliced._buffer, memoryview)
+        assert len(sliced) == 3
+        assert sliced.raw_data == data[(12 * 16) : (15 * 16)]
+        assert isinstance(sliced._buffer, bytes)
+        assert pickle.loads(pickle.dumps(audio_segment[1:3])) == audio_segment[1:3]
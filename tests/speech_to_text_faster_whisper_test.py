@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import os
+import wave
 
 from open_dubbing.speech_to_text_faster_whisper import SpeechToTextFasterWhisper
 
@@ -32,6 +33,29 @@ class TestTextToSpeechFasterWhisper:
         )
         assert text.strip() == "This is a test."
 
+    def test_transcribe_batch(self):
+        data_dir = os.path.dirname(os.path.realpath(__file__))
+        filename = os.path.join(data_dir, "data/this_is_a_test.mp3")
+        texts = self.stt._transcribe_batch(
+            vocals_filepaths=[filename, filename], source_language_iso_639_1="en"
+        )
+        assert [text.strip() for text in texts] == ["This is a test."] * 2
+
+    def test_transcribe_batch_silence(self, tmp_path):
+        data_dir = os.path.dirname(os.path.realpath(__file__))
+        filename = os.path.join(data_dir, "data/this_is_a_test.mp3")
+        silence = str(tmp_path / "silence.wav")
+        with wave.open(silence, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(16000)
+            f.writeframes(bytes(2 * 16000 * 3))
+
+        texts = self.stt._transcribe_batch(
+            vocals_filepaths=[filename, silence], source_language_iso_639_1="en"
+        )
+        assert [text.strip() for text in texts] == ["This is a test.", ""]
+
     def test_detect_language(self):
         data_dir = os.path.dirname(os.path.realpath(__file__))
         filename = os.path.join(data_dir, "data/this_is_a_test.mp3")
@@ -104,6 +104,36 @@ class TestTranscribe:
         assert transcribed_audio_chunks[0]["text"] == ""
         assert not transcribed_audio_chunks[0]["for_dubbing"]
 
+    def test_transcribe_chunks_batches_by_duration(self):
+        batches = []
+
+        def _transcribe_batch(*, vocals_filepaths, source_language_iso_639_1):
+            batches.append(list(vocals_filepaths))
+            return [f"text {path}" for path in vocals_filepaths]
+
+        utterance_metadata = [
+            dict(path="long", start=0.0, end=5.0),
+            dict(path="short", start=5.0, end=5.2),
+            dict(path="medium", start=6.0, end=8.0),
+            dict(path="shortest", start=9.0, end=10.0),
+        ]
+        spt = SpeechToTextFasterWhisper()
+        spt._transcribe_batch = _transcribe_batch
+        transcribed_audio_chunks = spt.transcribe_audio_chunks(
+            utterance_metadata=utterance_metadata,
+            source_language="en",
+            no_dubbing_phrases=[],
+            batch_size=2,
+        )
+
+        assert batches == [["shortest", "medium"], ["long"]]
+        assert [chunk["text"] for chunk in transcribed_audio_chunks] == [
+            "text long",
+            "",
+            "text medium",
+            "text shortest",
+        ]
+
 
 class TestAddSpeakerInfo:
 
@@ -12,7 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
 import os
+import shutil
+
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
 
 from open_dubbing.text_to_speech_cli import TextToSpeechCLI
 
@@ -58,3 +63,33 @@ class TestTextToSpeech:
             assigned_voice="myvoice", directory="dir", text="hello world"
         )
         assert "dir/spk_myvoice/synth.wav" == pattern
+
+    def test_convert_text_to_speech_concurrently(self, tmp_path):
+        configuration = {
+            "command": "mkdir -p {directory}/spk_{assigned_voice} && "
+            'printf "{text}" > {directory}/spk_{assigned_voice}/synth.wav && '
+            "sleep 0.05",
+            "output_pattern": "{directory}/spk_{assigned_voice}/synth.wav",
+            "voices": [],
+        }
+        configuration_file = tmp_path / "tts_cli.json"
+        configuration_file.write_text(json.dumps(configuration))
+        tts = TextToSpeechCLI(configuration_file=str(configuration_file))
+        tts.output_dir = str(tmp_path)
+
+        def _convert(idx):
+            return tts._convert_text_to_speech(
+                assigned_voice="myvoice",
+                target_language="cat",
+                output_filename=str(tmp_path / f"dubbed_{idx}.mp3"),
+                text=f"utterance {idx}",
+                speed=1.0,
+            )
+
+        with patch.object(TextToSpeechCLI, "_convert_to_mp3", side_effect=shutil.move):
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                filenames = list(executor.map(_convert, range(8)))
+
+        for idx, filename in enumerate(filenames):
+            with open(filename) as f:
+                assert f"utterance {idx}" == f.read()
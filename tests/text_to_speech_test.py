@@ -156,6 +156,56 @@ class TestTextToSpeech:
 
             assert result[0]["speed"] == expected_final_speed
 
+    def test_dub_utterances_concurrency_keeps_order(self):
+        tts = TextToSpeechUT()
+
+        utterance_metadata = self._get_dub_metadata()
+
+        def _convert(*, output_filename, **kwargs):
+            return output_filename
+
+        with patch.object(
+            tts, "_does_voice_supports_speeds", return_value=False
+        ), patch.object(
+            tts, "_convert_text_to_speech_without_end_silence", side_effect=_convert
+        ), patch.object(
+            tts, "_calculate_target_utterance_speed", return_value=1.0
+        ):
+            result = tts.dub_utterances(
+                utterance_metadata=utterance_metadata,
+                output_directory="/output",
+                target_language="eng",
+                audio_file="",
+                concurrency=4,
+            )
+
+        assert [utterance["id"] for utterance in result] == [1, 2]
+        assert [utterance["dubbed_path"] for utterance in result] == [
+            "/output/dubbed_file.mp3",
+            "/output/dubbed_file.mp3",
+        ]
+
+    def test_dub_utterances_prepares_modified_utterances(self):
+        tts = TextToSpeechUT()
+
+        utterance_metadata = self._get_dub_metadata()
+        modified_metadata = [utterance_metadata[1]]
+
+        with patch.object(tts, "_prepare_utterances") as mock_prepare, patch.object(
+            tts, "_dub_utterance", side_effect=lambda **kwargs: kwargs["utterance"]
+        ):
+            tts.dub_utterances(
+                utterance_metadata=utterance_metadata,
+                output_directory="/output",
+                target_language="eng",
+                audio_file="",
+                modified_metadata=modified_metadata,
+            )
+
+        mock_prepare.assert_called_once_with(
+            utterances=modified_metadata, target_language="eng"
+        )
+
     def test_dub_utterances_modified_no_modification(self):
         tts = TextToSpeechUT()
 
@@ -47,6 +47,15 @@ class TestTranslationApertium:
             )
             assert translated_text == "Hola món"
 
+    def test_get_cache_id(self):
+        translation_apertium = TranslationApertium()
+        translation_apertium.set_server("http://fake-server")
+
+        assert (
+            "TranslationApertium::http://fake-server/"
+            == translation_apertium._get_cache_id()
+        )
+
     def test_get_language_pairs(self):
 
         translation_apertium = TranslationApertium()
@@ -0,0 +1,37 @@
+# Copyright 2024 Jordi Mas i Hernàndez <jmas@softcatala.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+
+from unittest.mock import patch
+
+from open_dubbing.translation_nllb_ct2 import TranslationNLLBCT2
+
+
+class TestTranslationNLLBCT2:
+
+    def test_get_converted_model_cached(self):
+        with tempfile.TemporaryDirectory() as directory, patch.dict(
+            os.environ, {"XDG_CACHE_HOME": directory}
+        ), patch("ctranslate2.converters.TransformersConverter") as mock_converter:
+            translation = TranslationNLLBCT2(compute_type="int8")
+            translation.model_name = "facebook/nllb-200-1.3B"
+            model_dir = os.path.join(
+                directory, "open_dubbing", "ct2", "nllb-200-1.3B-int8"
+            )
+            os.makedirs(model_dir)
+
+            assert translation._get_converted_model("nllb-200-1.3B") == model_dir
+            mock_converter.assert_not_called()
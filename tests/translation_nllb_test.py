@@ -66,3 +66,4 @@ class TestTranslationNLLB:
 
         assert len(pairs) == 6
         assert pairs == expected_pairs
+        assert translation.get_language_pairs() is pairs
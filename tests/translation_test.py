@@ -14,8 +14,11 @@
 
 """Tests for utility functions in translation.py."""
 
+import tempfile
+
 import pytest
 
+from open_dubbing.cache import Cache
 from open_dubbing.translation import Translation
 
 
@@ -154,3 +157,51 @@ class TestTranslation:
             translated_script=translated_script,
         )
         assert updated_metadata == expected_translated_metadata
+
+    def test_translate_script_batches(self):
+        translation = TranslationUT(batch_size=2)
+        batches = []
+        original = translation._translate_batch
+
+        def _translate_batch(source_language, target_language, texts):
+            batches.append(list(texts))
+            return original(source_language, target_language, texts)
+
+        translation._translate_batch = _translate_batch
+        script = (
+            "<BREAK>A longer sentence.<BREAK>Short.<BREAK><BREAK>Medium one.<BREAK>"
+        )
+        result = translation._translate_script(
+            script=script, source_language="eng", target_language="cat"
+        )
+
+        assert result == script
+        assert batches == [["Short.", "Medium one."], ["A longer sentence."]]
+
+    def test_translate_script_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = Cache(directory)
+            translation = TranslationUT()
+            script = "<BREAK>Hello.<BREAK>Bye.<BREAK>"
+            translation._translate_script(
+                script=script, source_language="eng", target_language="cat", cache=cache
+            )
+
+            batches = []
+            original = translation._translate_batch
+
+            def _translate_batch(source_language, target_language, texts):
+                batches.append(list(texts))
+                return original(source_language, target_language, texts)
+
+            translation._translate_batch = _translate_batch
+            result = translation._translate_script(
+                script="<BREAK>Hello.<BREAK>New.<BREAK>",
+                source_language="eng",
+                target_language="cat",
+                cache=cache,
+            )
+            cache.close()
+
+            assert result == "<BREAK>Hello.<BREAK>New.<BREAK>"
+            assert batches == [["New."]]
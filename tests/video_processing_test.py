@@ -17,6 +17,8 @@
 import os
 import tempfile
 
+from unittest.mock import patch
+
 import numpy as np
 
 from moviepy.audio.AudioClip import AudioArrayClip
@@ -68,6 +70,18 @@ class TestVideoProcessing:
                 ]
             )
 
+    @patch("open_dubbing.video_processing.FFmpeg.remove_audio")
+    @patch("open_dubbing.video_processing.FFmpeg.get_video_codec", return_value="vp8")
+    def test_split_audio_video_encodes_unsupported_codec(self, _, mock_remove_audio):
+        with tempfile.TemporaryDirectory() as temporary_directory:
+            mock_video_file = self._create_mock_video(temporary_directory, 1)
+            video_file, _ = VideoProcessing.split_audio_video(
+                video_file=mock_video_file, output_directory=temporary_directory
+            )
+
+            mock_remove_audio.assert_not_called()
+            assert os.path.exists(video_file)
+
     def test_combine_audio_video(self):
         with tempfile.TemporaryDirectory() as temporary_directory:
             audio_path = f"{temporary_directory}/audio.mp3"